@@ -333,6 +333,23 @@ MIGRATOR_RECORDS_DUMPLOADER_CLS = (
 )
 MIGRATOR_RECORDS_DUMP_CLS = "cds_ils.migrator.records:CDSRecordDump"
 
+#: Number of migrated records indexed at once while migrating a dump
+CDS_ILS_MIGRATOR_BULK_INDEX_SIZE = 1000
+#: Number of records of each bulk request when reindexing after a migration
+CDS_ILS_MIGRATOR_REINDEX_CHUNK_SIZE = 500
+#: Number of concurrent bulk requests when reindexing after a migration
+CDS_ILS_MIGRATOR_REINDEX_THREAD_COUNT = 4
+#: Number of processes building the indexed documents when reindexing after
+#: a migration. They are built by the command process if zero.
+CDS_ILS_MIGRATOR_REINDEX_WORKERS = 4
+#: Number of documents whose legacy files are migrated concurrently
+CDS_ILS_MIGRATOR_FILES_CONCURRENCY = 4
+#: Number of legacy files downloads started per second, not to overload the
+#: legacy server
+CDS_ILS_MIGRATOR_FILES_RATE = 1
+#: Seconds waited for the legacy server to respond to a file download
+CDS_ILS_MIGRATOR_FILES_TIMEOUT = 60
+
 ###############################################################################
 # JSONSchemas
 ###############################################################################
@@ -617,7 +634,9 @@ CDS_ILS_EZPROXY_URL = "https://ezproxy.cern.ch/login?url={url}"
 # CDS-ILS importer configuration
 ###############################################################################
 
-CDS_ILS_IMPORTER_RECORD_TAG = "//*[local-name() = 'record']"
+#: Tag of the records in the imported files, matched by the streaming parser
+#: (``{*}`` matches the tag in any namespace)
+CDS_ILS_IMPORTER_RECORD_TAG = "{*}record"
 
 CDS_ILS_IMPORTER_PROVIDERS = {
     "cds": {
@@ -632,9 +651,68 @@ CDS_ILS_IMPORTER_PROVIDERS = {
     "safari": {"priority": 4, "agency_code": "CaSebORM"},
 }
 
+#: Directory of the uploaded files, kept to resume their import tasks.
 CDS_ILS_IMPORTER_UPLOADS_PATH = "/tmp"
 
-CDS_ILS_IMPORTER_FILE_EXTENSIONS_ALLOWED = [".xml"]
+#: Number of records whose documents are matched with a single search request
+CDS_ILS_IMPORTER_MATCH_BATCH_SIZE = 50
+
+#: Number of records of an uploaded file imported by each Celery task.
+#: The uploads path must be shared with the Celery workers.
+CDS_ILS_IMPORTER_CHUNK_SIZE = 1000
+
+#: Index the imported records in bulk at the end of each import task (or
+#: chunk) instead of after each commit. Records created by the task are
+#: searchable only once the task has ended.
+CDS_ILS_IMPORTER_BULK_INDEXING = False
+
+#: Number of imported records committed in a single transaction. Each record
+#: is imported in its own savepoint, so a failing record is rolled back alone.
+#: The task entries of the records are inserted in bulk at each commit.
+CDS_ILS_IMPORTER_COMMIT_BATCH_SIZE = 100
+
+#: Number of processes converting the records from MARCXML ahead of their
+#: import by the ``importer import-from-file`` command, 0 to convert them in
+#: the importing process. The web and Celery imports always convert them in
+#: the importing process.
+CDS_ILS_IMPORTER_CONVERSION_WORKERS = 0
+
+#: Maximum number of records converted ahead of their import
+CDS_ILS_IMPORTER_CONVERSION_QUEUE_SIZE = 200
+
+#: Maximum number of task entries (import reports) inserted at once,
+#: including the entries of the skipped records. Reaching it commits the
+#: transaction before ``CDS_ILS_IMPORTER_COMMIT_BATCH_SIZE`` records.
+CDS_ILS_IMPORTER_ENTRIES_FLUSH_SIZE = 100
+
+#: Maximum seconds before the buffered task entries are inserted, committing
+#: the transaction, so that the progress of slow imports is reported
+CDS_ILS_IMPORTER_ENTRIES_FLUSH_INTERVAL = 5
+
+#: Seconds without progress after which a running task is considered
+#: interrupted and can be resumed. It must exceed the time its chunks may
+#: wait in the Celery queue.
+CDS_ILS_IMPORTER_RESUME_TIMEOUT = 3600
+
+#: Number of task entries returned by each call of the check endpoint
+CDS_ILS_IMPORTER_CHECK_PAGE_SIZE = 500
+
+#: Build the rules index of the conversion models when a Celery worker starts
+#: instead of when converting its first record
+CDS_ILS_IMPORTER_WARM_UP_MODELS = True
+
+#: Skip the records converted to the same data as on their last import,
+#: reporting them as unchanged. Records modified in the ILS since their last
+#: import are skipped too, so it is disabled by default.
+CDS_ILS_IMPORTER_SKIP_UNCHANGED_RECORDS = False
+
+#: Extensions of the files accepted by the importer. Gzip compressed files
+#: and zip archives of xml files are decompressed while being imported.
+CDS_ILS_IMPORTER_FILE_EXTENSIONS_ALLOWED = [".xml", ".xml.gz", ".zip"]
+
+#: Maximum size in bytes of each decompressed file of an imported gzip file
+#: or zip archive
+CDS_ILS_IMPORTER_MAX_DECOMPRESSED_SIZE = 2 * 1024 * 1024 * 1024  # 2 GiB
 
 CDS_ILS_IMPORTER_PROVIDERS_ALLOWED_TO_DELETE_RECORDS = ["ebl", "safari"]
 
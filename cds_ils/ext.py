@@ -7,9 +7,11 @@
 
 """CDS-ILS extension."""
 
+from celery.signals import worker_init
 from flask import Blueprint
 from invenio_records.signals import after_record_insert, after_record_update
 
+from cds_ils.importer import warm_up_models
 from cds_ils.literature.tasks import pick_identifier_with_cover
 
 
@@ -38,3 +40,5 @@ class CdsIls(object):
         if app.config.get("CDS_ILS_LITERATURE_UPDATE_COVERS", True):
             after_record_insert.connect(pick_identifier_with_cover)
             after_record_update.connect(pick_identifier_with_cover)
+        if app.config.get("CDS_ILS_IMPORTER_WARM_UP_MODELS", True):
+            worker_init.connect(warm_up_models)
@@ -6,9 +6,8 @@
 # the terms of the MIT License; see LICENSE file for more details.
 
 """CDS-ILS RecordDumpLoader module."""
-import pkg_resources
-
 from cds_ils.importer.errors import RecordNotDeletable
+from cds_ils.importer.providers import get_importer_class
 
 
 class XMLRecordDumpLoader(object):
@@ -17,19 +16,35 @@ class XMLRecordDumpLoader(object):
     @classmethod
     def get_importer_class(cls, provider):
         """Load importer for a given provider."""
-        return pkg_resources.load_entry_point(
-            "cds-ils", "cds_ils.importers", provider
+        return get_importer_class(provider)
+
+    @classmethod
+    def get_importer(cls, dump_model, provider, mode, **kwargs):
+        """Convert the dump and return the importer of the record."""
+        return cls.create_importer(
+            dump_model.dump(), provider, mode, **kwargs
         )
 
     @classmethod
-    def process(cls, dump_model, provider, mode):
-        """Process the JSON dump."""
-        timestamp, json_data, is_deletable = dump_model.dump()
+    def create_importer(cls, record_dump, provider, mode, **kwargs):
+        """Return the importer of an already converted record."""
+        timestamp, json_data, is_deletable = record_dump
         importer_class = cls.get_importer_class(provider)
         if mode == "delete" and not is_deletable:
             raise RecordNotDeletable()
+        return importer_class(json_data, provider, **kwargs)
+
+    @classmethod
+    def run(cls, importer, mode):
+        """Import or delete the record of the importer."""
         if mode == "create":
-            report = importer_class(json_data, provider).import_record()
-        elif mode == "delete" and is_deletable:
-            report = importer_class(json_data, provider).delete_record()
+            report = importer.import_record()
+        elif mode == "delete":
+            report = importer.delete_record()
         return report
+
+    @classmethod
+    def process(cls, dump_model, provider, mode, **kwargs):
+        """Process the JSON dump."""
+        importer = cls.get_importer(dump_model, provider, mode, **kwargs)
+        return cls.run(importer, mode)
@@ -10,6 +10,8 @@
 import datetime
 
 from cds_dojson.marc21.utils import create_record
+from cds_dojson.matcher import matcher
+from cds_dojson.overdo import OverdoBase
 from flask import current_app
 from invenio_pidstore.resolver import Resolver
 from invenio_records.api import Record
@@ -58,13 +60,19 @@ class XMLRecordToJson(object):
         else:
             is_deletable = False
         try:
+            dojson_model = self.dojson_model
+            if isinstance(dojson_model, OverdoBase):
+                # match the model once instead of on each call
+                dojson_model = matcher(
+                    marc_record, dojson_model.entry_point_models
+                )
 
             # MARCXML -> JSON fields translation
-            val = self.dojson_model.do(
+            val = dojson_model.do(
                 marc_record, exception_handlers=exception_handlers
             )
             # check for missing rules
-            missing = self.dojson_model.missing(marc_record)
+            missing = dojson_model.missing(marc_record)
 
             if missing:
                 raise LossyConversion(missing=missing)
@@ -7,7 +7,27 @@
 
 """CDS-IlS Importer module."""
 
+import pkg_resources
 from cds_dojson.overdo import OverdoBase
 
 # Matching to a correct model is happening here
 marc21 = OverdoBase(entry_point_models="cds_ils.importer.models")
+
+MODELS_ENTRY_POINT_GROUPS = (
+    "cds_ils.importer.models",
+    "cds_ils.importer.series_models",
+)
+
+
+def warm_up_models(sender=None, **kwargs):
+    """Build the rules index of all the conversion models.
+
+    The indexes are otherwise built lazily when converting the first record.
+    It can be connected to the ``worker_init`` Celery signal, so that the
+    worker processes start with the models ready.
+    """
+    for group in MODELS_ENTRY_POINT_GROUPS:
+        for entry_point in pkg_resources.iter_entry_points(group):
+            model = entry_point.load()
+            if model.index is None:
+                model.build()
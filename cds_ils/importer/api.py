@@ -7,16 +7,28 @@
 
 """CDS-ILS Importer API module."""
 import logging
+import multiprocessing
+import os
+from collections import deque
+from itertools import islice
 
 from celery import shared_task
 from flask import current_app
 from invenio_app_ils.errors import IlsValidationError
 from invenio_db import db
+from lxml import etree
 
-from cds_ils.importer.errors import LossyConversion, \
-    ProviderNotAllowedDeletion, RecordNotDeletable
-from cds_ils.importer.models import ImporterTaskEntry, ImporterTaskLog
-from cds_ils.importer.parse_xml import get_records_list
+from cds_ils.importer.documents.importer import DocumentIdentifiersIndex, \
+    DocumentImporter
+from cds_ils.importer.errors import ImporterTaskNotResumable, \
+    LossyConversion, ProviderNotAllowedDeletion, RecordNotDeletable
+from cds_ils.importer.indexer import ImporterBulkIndexer
+from cds_ils.importer.models import ImportedRecordFingerprint, \
+    ImporterTaskEntryWriter, ImporterTaskLog
+from cds_ils.importer.overdo import RuleProfiler
+from cds_ils.importer.parse_xml import count_source_records, \
+    get_source_records, remove_chunk_files, split_source_records
+from cds_ils.importer.series.importer import SeriesMatchesCache
 from cds_ils.importer.XMLRecordLoader import XMLRecordDumpLoader
 from cds_ils.importer.XMLRecordToJson import XMLRecordToJson
 
@@ -30,13 +42,26 @@ def process_dump(data, provider, mode, source_type):
         data,
         source_type=source_type,
     )
+    bulk_indexer = ImporterBulkIndexer()
     try:
-        report = XMLRecordDumpLoader.process(recorddump, provider, mode)
+        report = XMLRecordDumpLoader.process(
+            recorddump, provider, mode, bulk_indexer=bulk_indexer
+        )
         db.session.commit()
-        return report
     except Exception as e:
         db.session.rollback()
         raise e
+    bulk_indexer.commit()
+    bulk_indexer.flush()
+    return report
+
+
+def validate_import_mode(provider, mode):
+    """Check that the provider is allowed to run the import mode."""
+    if provider not in current_app.config[
+        "CDS_ILS_IMPORTER_PROVIDERS_ALLOWED_TO_DELETE_RECORDS"
+    ] and mode == 'delete':
+        raise ProviderNotAllowedDeletion(provider=provider)
 
 
 def import_record(data, provider, mode, source_type=None, eager=False):
@@ -44,59 +69,513 @@ def import_record(data, provider, mode, source_type=None, eager=False):
     source_type = source_type or "marcxml"
     assert source_type in ["marcxml"]
 
-    if provider not in current_app.config[
-        "CDS_ILS_IMPORTER_PROVIDERS_ALLOWED_TO_DELETE_RECORDS"
-    ] and mode == 'delete':
-        raise ProviderNotAllowedDeletion(provider=provider)
+    validate_import_mode(provider, mode)
     if eager:
         return process_dump(data, provider, mode, source_type=source_type)
     else:
         process_dump.delay(data, provider, mode, source_type=source_type)
 
 
-def import_from_xml(log_id, source_path, source_type, provider, mode):
-    """Load a single xml file."""
+def _convert_record(record, source_type):
+    """Convert a record, returning its dump or the conversion error."""
+    try:
+        recorddump = XMLRecordToJson(record, source_type=source_type)
+        return recorddump.dump(), None
+    except Exception as e:
+        return None, e
+
+
+# application of the parent process, inherited by the forked workers
+_conversion_app = None
+
+
+def _convert_serialized_record(data, source_type):
+    """Convert a serialized record in a conversion worker process."""
+    with _conversion_app.app_context():
+        return _convert_record(data, source_type)
+
+
+def _convert_records(records, source_type, workers=0):
+    """Convert the records, yielding their dump or conversion error.
+
+    With ``workers`` set, the records are converted ahead by a pool of
+    processes, while the caller imports the previous ones. The workers are
+    forked, to inherit the application, so this requires a platform
+    supporting fork. At most ``CDS_ILS_IMPORTER_CONVERSION_QUEUE_SIZE``
+    records are converted ahead.
+    The pool is only meant for the command line: the web and Celery
+    imports convert the records inline. The records are also converted
+    inline when profiling the rules.
+    """
+    global _conversion_app
+
+    if not workers or RuleProfiler.current() is not None:
+        for record in records:
+            yield _convert_record(record, source_type)
+        return
+
+    queue_size = current_app.config["CDS_ILS_IMPORTER_CONVERSION_QUEUE_SIZE"]
+    context = multiprocessing.get_context("fork")
+    _conversion_app = current_app._get_current_object()
+    # the workers must not share the database connections of the parent
+    db.engine.dispose()
+    pool = context.Pool(workers)
+    pending = deque()
+    try:
+        for record in records:
+            # serialize the record now, the parser frees it once consumed
+            pending.append(pool.apply_async(
+                _convert_serialized_record,
+                (etree.tostring(record), source_type),
+            ))
+            if len(pending) >= queue_size:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _load_importers(log_id, records, provider, mode, source_type, start,
+                    entry_writer, conversion_workers=0, **kwargs):
+    """Convert the records, yielding their entry data and importer."""
+    record_dumps = _convert_records(
+        records, source_type, workers=conversion_workers
+    )
+    for i, (record_dump, error) in enumerate(record_dumps, start):
+        entry_data = dict(
+            import_id=log_id,
+            entry_index=i,
+        )
+        try:
+            validate_import_mode(provider, mode)
+            if error is not None:
+                raise error
+            importer = XMLRecordDumpLoader.create_importer(
+                record_dump, provider, mode, **kwargs
+            )
+        except (LossyConversion, RecordNotDeletable,
+                ProviderNotAllowedDeletion) as e:
+            entry_writer.add_failure(entry_data, e)
+            continue
+        except Exception as e:
+            entry_writer.add_failure(entry_data, e)
+            raise e
+        yield entry_data, importer
+
+
+def _batches(iterable, size):
+    """Split an iterable in lists of at most the given size."""
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _fingerprint_batch(batch, provider, mode, entry_writer, skip_unchanged):
+    """Fingerprint the records of a batch, skipping the unchanged ones.
+
+    The records unchanged since their last import are reported as such.
+    Return the other records along with their fingerprint, if any.
+    """
+    if mode != "create":
+        return [(entry_data, importer, None) for entry_data, importer in batch]
+
+    fingerprints = [
+        ImportedRecordFingerprint.compute(importer.json_data)
+        for _, importer in batch
+    ]
+    stored = {}
+    if skip_unchanged:
+        stored = ImportedRecordFingerprint.get_fingerprints(provider, [
+            importer.json_data["provider_recid"] for _, importer in batch
+            if importer.json_data.get("provider_recid")
+        ])
+
+    changed = []
+    for (entry_data, importer), fingerprint in zip(batch, fingerprints):
+        provider_recid = importer.json_data.get("provider_recid")
+        if provider_recid and stored.get(provider_recid) == fingerprint:
+            entry_writer.add_unchanged(entry_data)
+        else:
+            changed.append((entry_data, importer, fingerprint))
+    return changed
+
+
+def _update_fingerprint(importer, mode, report, fingerprint):
+    """Keep the fingerprint of a record written by its import."""
+    provider_recid = importer.json_data.get("provider_recid")
+    if not provider_recid or not (report["created"] or report["updated"]):
+        return
+    if mode == "create":
+        ImportedRecordFingerprint.store(
+            importer.metadata_provider, provider_recid, fingerprint
+        )
+    else:
+        # the record is not imported as it was anymore
+        ImportedRecordFingerprint.forget(
+            importer.metadata_provider, provider_recid
+        )
+
+
+def _import_entry(entry_data, importer, mode, entry_writer,
+                  fingerprint=None):
+    """Import the record of a task entry and store its report.
+
+    The record is imported in a savepoint, so that a failing record is
+    rolled back alone without discarding the uncommitted batch, nor the
+    index operations of its records. Return the report of the record, if
+    imported.
+    """
+    try:
+        with importer.bulk_indexer.begin_nested(), \
+                db.session.begin_nested():
+            report = XMLRecordDumpLoader.run(importer, mode)
+            _update_fingerprint(importer, mode, report, fingerprint)
+    except IlsValidationError as e:
+        importer.forget_created_records()
+        records_logger.error(
+            "@FILE TASK: {0} FATAL: {1}".format(
+                entry_data["import_id"],
+                str(e.original_exception.message),
+            )
+        )
+        entry_writer.add_failure(entry_data, e)
+        return None
+    except Exception as e:
+        importer.forget_created_records()
+        entry_writer.add_failure(entry_data, e)
+        raise e
+
+    entry_writer.add_success(entry_data, report)
+    return report
+
+
+def _commit_batch(entry_writer, bulk_indexer):
+    """Commit the imported records of a batch with their task entries."""
+    try:
+        entry_writer.flush()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        bulk_indexer.discard()
+        raise
+    bulk_indexer.commit()
+
+
+def import_records(log_id, records, provider, mode, source_type, start=0,
+                   on_entry=None, conversion_workers=0, bulk_indexer=None,
+                   series_cache=None, identifiers_index=None):
+    """Import the records of a task.
+
+    The records are converted and their documents are matched in batches
+    of ``CDS_ILS_IMPORTER_MATCH_BATCH_SIZE``, sending all the matching
+    searches of a batch in a single request. Once a record creates or
+    updates a document, the following records of the batch are matched by
+    title and authors with new searches, so that they can match it. The
+    series matching each identifier are cached for all the records of the
+    task, and the documents it creates or updates are indexed by ISBN and
+    DOI so that the following records match them before they are
+    searchable.
+
+    The transaction is committed every ``CDS_ILS_IMPORTER_COMMIT_BATCH_SIZE``
+    records, or earlier when the buffered task entries are due to be
+    inserted (see ``CDS_ILS_IMPORTER_ENTRIES_FLUSH_SIZE`` and
+    ``CDS_ILS_IMPORTER_ENTRIES_FLUSH_INTERVAL``), so that the entries are
+    always committed together with their records. The imported records
+    are bulk indexed after each commit, or once all the records have been
+    processed with ``CDS_ILS_IMPORTER_BULK_INDEXING`` enabled.
+
+    With ``CDS_ILS_IMPORTER_SKIP_UNCHANGED_RECORDS`` enabled, the records
+    converted to the same data as on their last import are not imported
+    again and reported as unchanged.
+
+    :param start: index in the source file of the first record.
+    :param on_entry: function called with the entry of each record.
+    :param conversion_workers: number of processes converting the records
+        ahead of their import, see `_convert_records`.
+    :param bulk_indexer: indexer of the records of the task, see
+        `ImporterBulkIndexer`.
+    :param series_cache: series matches of the task, see
+        `SeriesMatchesCache`.
+    :param identifiers_index: documents of the task by identifier, see
+        `DocumentIdentifiersIndex`.
+    """
+    batch_size = current_app.config["CDS_ILS_IMPORTER_MATCH_BATCH_SIZE"]
+    commit_batch_size = current_app.config[
+        "CDS_ILS_IMPORTER_COMMIT_BATCH_SIZE"
+    ]
+    entry_writer = ImporterTaskEntryWriter(
+        current_app.config["CDS_ILS_IMPORTER_ENTRIES_FLUSH_SIZE"],
+        current_app.config["CDS_ILS_IMPORTER_ENTRIES_FLUSH_INTERVAL"],
+        on_entry=on_entry,
+    )
+    skip_unchanged = current_app.config[
+        "CDS_ILS_IMPORTER_SKIP_UNCHANGED_RECORDS"
+    ]
+    index_at_end = current_app.config["CDS_ILS_IMPORTER_BULK_INDEXING"]
+    bulk_indexer = bulk_indexer or ImporterBulkIndexer()
+
+    importers = _load_importers(
+        log_id, records, provider, mode, source_type, start, entry_writer,
+        conversion_workers=conversion_workers,
+        bulk_indexer=bulk_indexer,
+        series_cache=series_cache or SeriesMatchesCache(),
+        identifiers_index=identifiers_index or DocumentIdentifiersIndex(),
+    )
+    uncommitted = 0
+    try:
+        for batch in _batches(importers, batch_size):
+            changed = _fingerprint_batch(
+                batch, provider, mode, entry_writer, skip_unchanged
+            )
+            document_importers = [
+                importer.document_importer for _, importer, _ in changed
+            ]
+            DocumentImporter.prefetch_matches(document_importers)
+            for position, (entry_data, importer, fingerprint) in enumerate(
+                changed
+            ):
+                report = _import_entry(
+                    entry_data, importer, mode, entry_writer, fingerprint
+                )
+                if report and (report["created"] or report["updated"]):
+                    # the following records of the batch may match it
+                    for document_importer in document_importers[
+                        position + 1:
+                    ]:
+                        document_importer.invalidate_prefetched_matches()
+                uncommitted += 1
+                if uncommitted >= commit_batch_size or \
+                        entry_writer.is_due():
+                    _commit_batch(entry_writer, bulk_indexer)
+                    if not index_at_end:
+                        bulk_indexer.flush()
+                    uncommitted = 0
+            if entry_writer.is_due():
+                # the entries of the unchanged records
+                _commit_batch(entry_writer, bulk_indexer)
+                uncommitted = 0
+    finally:
+        # keep the records imported before an error, the failing record
+        # has already been rolled back to its savepoint
+        try:
+            _commit_batch(entry_writer, bulk_indexer)
+        finally:
+            # index the records already committed, even if the task failed
+            bulk_indexer.flush()
+
+
+def _create_task_caches():
+    """Return the indexer and caches shared by the records of a task."""
+    return dict(
+        bulk_indexer=ImporterBulkIndexer(),
+        series_cache=SeriesMatchesCache(),
+        identifiers_index=DocumentIdentifiersIndex(),
+    )
+
+
+@shared_task()
+def import_chunk(log_id, chunk_path, source_type, provider, mode, start,
+                 end):
+    """Import the records of a chunk file, see `split_source_records`.
+
+    :param start: index in the source file of the first record of the chunk.
+    """
+    try:
+        records = get_source_records(chunk_path)
+        import_records(
+            log_id, records, provider, mode, source_type, start=start
+        )
+    except Exception as e:
+        db.session.rollback()
+        records_logger.error(
+            "@FILE TASK: {0} CHUNK: {1}-{2} ERROR: {3}".format(
+                log_id, start, end, str(e)
+            )
+        )
+        ImporterTaskLog.finish_chunk(log_id, exception=e)
+        raise e
+    finally:
+        # a failed chunk is resumed from the source file of the task
+        remove_chunk_files([(start, end, chunk_path)])
+
+    ImporterTaskLog.finish_chunk(log_id)
+
+
+def _split_chunks(source_path, ranges):
+    """Split the records to import in chunk files.
+
+    The source is parsed once and each chunk of
+    ``CDS_ILS_IMPORTER_CHUNK_SIZE`` records is written to its own file, so
+    that importing a chunk does not parse the records before it.
+
+    :param ranges: ranges of the indexes of the records to import.
+    """
+    chunk_size = current_app.config["CDS_ILS_IMPORTER_CHUNK_SIZE"]
+    chunks = [
+        (start, min(start + chunk_size, end))
+        for range_start, end in ranges
+        for start in range(range_start, end, chunk_size)
+    ]
+    directory = current_app.config["CDS_ILS_IMPORTER_UPLOADS_PATH"]
+    return split_source_records(source_path, chunks, directory)
+
+
+def _dispatch_chunks(log, source_path, source_type, provider, mode,
+                     ranges):
+    """Split the task in chunks of records imported by Celery workers.
+
+    When a chunk cannot be dispatched, the task is marked as failed, only
+    counting the chunks already dispatched, and the files of the others
+    are removed.
+
+    :param ranges: ranges of the indexes of the records to import.
+    """
+    chunks = _split_chunks(source_path, ranges)
+    log.chunks_count = len(chunks)
+    db.session.commit()
+
+    dispatched = 0
+    try:
+        for start, end, chunk_path in chunks:
+            import_chunk.delay(
+                log.id, chunk_path, source_type, provider, mode, start, end
+            )
+            dispatched += 1
+    except Exception as e:
+        db.session.rollback()
+        remove_chunk_files(chunks[dispatched:])
+        # lock the task against the dispatched chunks, see `finish_chunk`
+        db.session.refresh(log, with_for_update=True)
+        log.chunks_count = dispatched
+        log.set_failed(e)
+        raise e
+
+
+def import_from_xml(log_id, source_path, source_type, provider, mode,
+                    parallel=False, profile=False, on_entry=None,
+                    conversion_workers=0):
+    """Load a single xml file.
+
+    The file can also be gzip compressed or a zip archive of xml files,
+    which is decompressed while its records are imported.
+
+    :param parallel: split the file in chunks of
+        ``CDS_ILS_IMPORTER_CHUNK_SIZE`` records imported by Celery workers.
+        The task is then marked as complete by the last ended chunk.
+    :param profile: store on the task the cost of each conversion rule.
+        Only applies to the files imported in the current process.
+    :param on_entry: function called with the entry of each record imported
+        in the current process.
+    :param conversion_workers: number of processes converting the records
+        imported in the current process, to be set from the command line
+        only (see `_convert_records`).
+    """
     log = ImporterTaskLog.query.filter_by(id=log_id).first()
-    entry_data = None
+    chunk_size = current_app.config["CDS_ILS_IMPORTER_CHUNK_SIZE"]
     try:
-        with open(source_path) as source:
-            records_list = list(get_records_list(source))
+        # keep the source to resume the task, see `resume_import`
+        log.source_path = os.path.abspath(source_path)
+        # update the entries count now that we know it
+        log.entries_count = count_source_records(source_path)
+        db.session.commit()
 
-            # update the entries count now that we know it
-            log.entries_count = len(records_list)
-            db.session.commit()
+        if parallel and log.entries_count > chunk_size:
+            _dispatch_chunks(
+                log, source_path, source_type, provider, mode,
+                [(0, log.entries_count)],
+            )
+            return
 
-            for i, record in enumerate(records_list):
-                entry_data = dict(
-                    import_id=log.id,
-                    entry_index=i,
+        task_caches = _create_task_caches()
+        if profile:
+            with RuleProfiler() as profiler:
+                import_records(
+                    log.id, get_source_records(source_path), provider, mode,
+                    source_type, on_entry=on_entry, **task_caches
                 )
-                try:
-                    report = import_record(record, provider, mode,
-                                           source_type=source_type,
-                                           eager=True)
-                except (LossyConversion, RecordNotDeletable,
-                        ProviderNotAllowedDeletion) as e:
-                    ImporterTaskEntry.create_failure(entry_data, e)
-                    continue
-                except IlsValidationError as e:
-                    records_logger.error(
-                        "@FILE TASK: {0} FATAL: {1}".format(
-                            log_id,
-                            str(e.original_exception.message),
-                        )
-                    )
-                    ImporterTaskEntry.create_failure(entry_data, e)
-                    continue
-
-                ImporterTaskEntry.create_success(entry_data, report)
+            log.profile = profiler.report()
+        else:
+            import_records(
+                log.id, get_source_records(source_path), provider, mode,
+                source_type, on_entry=on_entry,
+                conversion_workers=conversion_workers, **task_caches
+            )
     except Exception as e:
+        db.session.rollback()
         records_logger.error(
             "@FILE TASK: {0} ERROR: {1}".format(log_id, str(e))
         )
-        if entry_data:
-            ImporterTaskEntry.create_failure(entry_data, e)
-        log.set_failed(e)
+        if log.is_running():
+            # not already failed while dispatching its chunks
+            log.set_failed(e)
+        raise e
+
+    log.set_succeeded()
+
+
+def resume_import(log_id, parallel=False, force=False):
+    """Resume an interrupted task, e.g. after its worker died.
+
+    The stored source file of the task is parsed again, once, to split the
+    records without a task entry in chunk files, and these records are
+    imported under the same task. The records processed before the
+    interruption are kept. Only the failed tasks, and the running tasks
+    without progress for ``CDS_ILS_IMPORTER_RESUME_TIMEOUT`` seconds, can
+    be resumed.
+
+    :param parallel: import the remaining records in chunks of
+        ``CDS_ILS_IMPORTER_CHUNK_SIZE`` records, by Celery workers.
+    :param force: resume the task even if it is running, once its process
+        is known to be dead.
+    """
+    log = ImporterTaskLog.query.filter_by(id=log_id).first()
+    if log is None:
+        raise ImporterTaskNotResumable(log_id=log_id)
+
+    provider = log.provider
+    mode = log.mode.value.lower()
+    source_type = log.source_type
+    log.set_resumed(force=force)
+    try:
+        if log.entries_count is None:
+            # interrupted before counting the records
+            log.entries_count = count_source_records(log.source_path)
+            db.session.commit()
+        ranges = log.unprocessed_ranges()
+
+        remaining = sum(end - start for start, end in ranges)
+        chunk_size = current_app.config["CDS_ILS_IMPORTER_CHUNK_SIZE"]
+        if parallel and remaining > chunk_size:
+            _dispatch_chunks(
+                log, log.source_path, source_type, provider, mode, ranges
+            )
+            return
+
+        chunks = _split_chunks(log.source_path, ranges)
+        task_caches = _create_task_caches()
+        try:
+            for start, end, chunk_path in chunks:
+                import_records(
+                    log.id, get_source_records(chunk_path), provider, mode,
+                    source_type, start=start, **task_caches
+                )
+        finally:
+            remove_chunk_files(chunks)
+    except Exception as e:
+        db.session.rollback()
+        records_logger.error(
+            "@FILE TASK: {0} RESUME ERROR: {1}".format(log_id, str(e))
+        )
+        if log.is_running():
+            # not already failed while dispatching its chunks
+            log.set_failed(e)
         raise e
 
     log.set_succeeded()
@@ -7,16 +7,13 @@
 
 """CDS-ILS Importer command lines module."""
 import click
+from flask import current_app
 from flask.cli import with_appcontext
-from invenio_app_ils.errors import IlsValidationError
-from invenio_db import db
 
-from cds_ils.importer.api import import_record, records_logger
-from cds_ils.importer.errors import LossyConversion, \
-    ProviderNotAllowedDeletion, RecordNotDeletable
+from cds_ils.importer.api import import_from_xml, resume_import
+from cds_ils.importer.errors import ImporterTaskNotResumable
 from cds_ils.importer.models import ImporterAgent, ImporterMode, \
-    ImporterTaskEntry, ImporterTaskLog
-from cds_ils.importer.parse_xml import get_records_list
+    ImporterTaskLog
 
 
 @click.group()
@@ -25,7 +22,9 @@ def importer():
 
 
 @importer.command()
-@click.argument("sources", type=click.File("r"), nargs=-1)
+@click.argument(
+    "sources", type=click.Path(exists=True, dir_okay=False), nargs=-1
+)
 @click.option(
     "--provider",
     "-p",
@@ -40,85 +39,106 @@ def importer():
     type=click.Choice(["create", "delete"]),
     help="Choose the mode",
 )
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Report and store the cost of each conversion rule",
+)
 @with_appcontext
-def import_from_file(sources, provider, mode, source_type="marcxml"):
+def import_from_file(sources, provider, mode, source_type="marcxml",
+                     profile=False):
     """Import from file command."""
-    import_from_xml(sources, provider, mode, source_type)
+    import_from_files(sources, provider, mode, source_type, profile=profile)
+
+
+def echo_profile(profile, limit=20):
+    """Print the most expensive conversion rules."""
+    click.secho("Slowest conversion rules:", fg="blue")
+    for stat in profile[:limit]:
+        click.echo(
+            "{time:>10.4f}s {calls:>8} calls {exceptions:>6} errors "
+            "{model} {tag} {rule}".format(**stat)
+        )
+
+
+def echo_entry(entry):
+    """Print the outcome of the import of a record."""
+    click.secho("Processed record {}".format(entry["entry_index"]))
+    if entry.get("error"):
+        click.secho(
+            "Failed to import entry: {}".format(entry["error"]), fg="red"
+        )
+    elif entry.get("unchanged"):
+        click.secho("Unchanged since its last import", fg="blue")
+    else:
+        click.secho(
+            "Created: {}\n "
+            "Updated: "
+            "{}\n "
+            "Ambiguous matches {}\n "
+            "Fuzzy matches {}\n".format(
+                entry["created_document"],
+                entry["updated_document"],
+                entry["ambiguous_documents"],
+                entry["fuzzy_documents"],
+            ),
+            fg="blue",
+        )
 
 
-def import_from_xml(sources, provider, mode, source_type, eager=True):
+def echo_summary(log):
+    """Print the number of imported, unchanged and failed records."""
+    click.secho(
+        "Imported: {}\n Unchanged: {}\n Failed: {}\n".format(
+            log.loaded_entries - log.failed_entries - log.unchanged_entries,
+            log.unchanged_entries,
+            log.failed_entries,
+        ),
+        fg="red" if log.failed_entries else "blue",
+    )
+
+
+def import_from_files(sources, provider, mode, source_type, profile=False):
     """Load xml files."""
     for idx, source in enumerate(sources, 1):
         click.echo(
             "({}/{}) Importing documents in {}...".format(
-                idx, len(sources), source.name
+                idx, len(sources), source
             )
         )
         log = ImporterTaskLog.create(dict(
             agent=ImporterAgent.CLI,
             provider=provider,
             source_type=source_type,
-            mode=ImporterMode.CREATE,  # commands act as create
-            original_filename=source.name,
+            mode=ImporterMode(mode.upper()),
+            original_filename=source,
         ))
 
-        entry_data = None
-        try:
-            records_list = list(get_records_list(source))
-            log.entries_count = len(records_list)
-            db.session.commit()
-            for i, record in enumerate(records_list):
-                entry_data = dict(
-                    import_id=log.id,
-                    entry_index=i,
-                )
-                click.secho("Processing record {}".format(i))
-
-                try:
-                    report = import_record(
-                        record, provider, mode,
-                        source_type=source_type, eager=True
-                    )
-                except (LossyConversion, RecordNotDeletable,
-                        ProviderNotAllowedDeletion) as e:
-                    click.secho("Failed to import entry", fg="red")
-                    ImporterTaskEntry.create_failure(entry_data, e)
-                    continue
-
-                click.secho(
-                    "Created: {}\n "
-                    "Updated: "
-                    "{}\n "
-                    "Ambiguous matches {}\n "
-                    "Fuzzy matches {}\n".format(
-                        report["created"],
-                        report["updated"],
-                        report["ambiguous_documents"],
-                        report["fuzzy"],
-                    ),
-                    fg="blue",
-                )
-                ImporterTaskEntry.create_success(entry_data, report)
-
-        except IlsValidationError as e:
-            records_logger.error(
-                "@FILE: {0} FATAL: {1}".format(
-                    source.name,
-                    str(e.original_exception.message),
-                )
-            )
-            if entry_data:
-                ImporterTaskEntry.create_failure(entry_data, e)
-            log.set_failed(e)
-            continue
-
-        except Exception as e:
-            records_logger.error(
-                "@FILE: {0} ERROR: {1}".format(source.name, str(e))
-            )
-            if entry_data:
-                ImporterTaskEntry.create_failure(entry_data, e)
-            log.set_failed(e)
-            raise e
+        import_from_xml(
+            log.id, source, source_type, provider, mode, profile=profile,
+            on_entry=echo_entry,
+            conversion_workers=current_app.config[
+                "CDS_ILS_IMPORTER_CONVERSION_WORKERS"
+            ],
+        )
+
+        echo_summary(log)
+        if profile:
+            echo_profile(log.profile)
 
-        log.set_succeeded()
+
+@importer.command()
+@click.argument("log_id", type=int)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Resume the task even if it is running, e.g. after a crash",
+)
+@with_appcontext
+def resume(log_id, force=False):
+    """Resume an interrupted import task."""
+    try:
+        resume_import(log_id, force=force)
+    except ImporterTaskNotResumable as e:
+        raise click.ClickException(e.message)
+    echo_summary(ImporterTaskLog.query.filter_by(id=log_id).one())
@@ -7,9 +7,10 @@
 
 """CDS-ILS Importer module."""
 import click
-from elasticsearch_dsl import Q
+from elasticsearch_dsl import MultiSearch, Q
 from elasticsearch_dsl.query import Match
 from invenio_app_ils.proxies import current_app_ils
+from invenio_search import current_search_client
 
 from cds_ils.importer.errors import DocumentImportError
 
@@ -80,6 +81,42 @@ def search_documents_by_doi(doi):
     return search
 
 
+def search_documents_by_identifiers(identifiers, schemes=("ISBN", "DOI")):
+    """Find the documents having any of the given identifiers.
+
+    All the identifiers are matched in a single query, with a ``terms``
+    query on the values of each scheme.
+
+    :param identifiers: list of identifiers, with their scheme and value.
+    :param schemes: schemes of the identifiers to match.
+    """
+    values_by_scheme = {}
+    for identifier in identifiers:
+        if identifier["scheme"] in schemes:
+            values_by_scheme.setdefault(identifier["scheme"], []).append(
+                identifier["value"]
+            )
+    if not values_by_scheme:
+        return None
+
+    document_search = current_app_ils.document_search_cls()
+    search = document_search.query(
+        "bool",
+        should=[
+            Q(
+                "bool",
+                filter=[
+                    Q("term", identifiers__scheme=scheme),
+                    Q("terms", identifiers__value=values),
+                ],
+            )
+            for scheme, values in values_by_scheme.items()
+        ],
+        minimum_should_match=1,
+    )
+    return search
+
+
 def search_document_by_title_authors(title, authors, subtitle=None):
     """Find document by title and authors."""
     document_search = current_app_ils.document_search_cls()
@@ -122,6 +159,30 @@ def fuzzy_search_document(title, authors):
     return search
 
 
+def multi_search_documents(searches, size=100):
+    """Execute document searches in a single multi search request.
+
+    The hits of each search are returned in the order of the searches.
+    A search matching more than ``size`` documents is scanned, so that
+    every hit is returned as with ``scan()``.
+    """
+    if not searches:
+        return []
+
+    multi_search = MultiSearch(using=current_search_client)
+    for search in searches:
+        multi_search = multi_search.add(search[:size])
+    responses = multi_search.execute()
+
+    results = []
+    for search, response in zip(searches, responses):
+        if response.hits.total.value > len(response.hits):
+            results.append(list(search.scan()))
+        else:
+            results.append(list(response.hits))
+    return results
+
+
 def get_document_by_legacy_recid(legacy_recid):
     """Search documents by its legacy recid."""
     document_search = current_app_ils.document_search_cls()
@@ -16,8 +16,48 @@ from invenio_app_ils.proxies import current_app_ils
 from invenio_db import db
 
 from cds_ils.importer.documents.api import fuzzy_search_document, \
-    search_document_by_title_authors, search_documents_by_doi, \
-    search_documents_by_isbn
+    multi_search_documents, search_document_by_title_authors, \
+    search_documents_by_identifiers
+
+
+class DocumentIdentifiersIndex(object):
+    """Documents written by an import task, by ISBN and DOI.
+
+    The documents created or updated by the previous records of a task are
+    not searchable until the index is refreshed, so the following records
+    match them by identifier with this index instead.
+    """
+
+    SCHEMES = ("ISBN", "DOI")
+
+    def __init__(self):
+        """Constructor."""
+        self.pids = {}
+
+    def add(self, document):
+        """Make the document match its identifiers."""
+        for identifier in document.get("identifiers", []):
+            if identifier["scheme"] not in self.SCHEMES:
+                continue
+            pids = self.pids.setdefault(
+                (identifier["scheme"], identifier["value"]), []
+            )
+            if document["pid"] not in pids:
+                pids.append(document["pid"])
+
+    def search(self, identifiers):
+        """Return the pids of the documents having any of the identifiers."""
+        matches = []
+        for identifier in identifiers:
+            pids = self.pids.get((identifier["scheme"], identifier["value"]))
+            matches += [pid for pid in pids or [] if pid not in matches]
+        return matches
+
+    def remove(self, pid):
+        """Forget a document, e.g. when its creation was rolled back."""
+        for pids in self.pids.values():
+            if pid in pids:
+                pids.remove(pid)
 
 
 class DocumentImporter(object):
@@ -29,12 +69,20 @@ class DocumentImporter(object):
         helper_metadata_fields,
         metadata_provider,
         update_document_fields,
+        identifiers_index=None,
     ):
         """Constructor."""
         self.helper_metadata_fields = helper_metadata_fields
         self.json_data = json_metadata
         self.metadata_provider = metadata_provider
         self.update_document_fields = update_document_fields
+        self.identifiers_index = identifiers_index
+        self.created = None
+
+        # search hits resolved in advance, see `prefetch_matches`
+        self._prefetched_identifiers_matches = None
+        self._prefetched_title_matches = None
+        self._prefetched_fuzzy_matches = None
 
     def _set_record_import_source(self, record_dict):
         """Set the import source for document."""
@@ -68,12 +116,13 @@ class DocumentImporter(object):
                 )
                 cleaned_json["pid"] = provider.pid.pid_value
                 document = document_class.create(cleaned_json, record_uuid)
-            db.session.commit()
+            self.created = document
+            if self.identifiers_index is not None:
+                self.identifiers_index.add(document)
             return document
         except IlsValidationError as e:
             click.secho("Field: {}".format(e.errors[0].res["field"]), fg="red")
             click.secho(e.original_exception.message, fg="red")
-            db.session.rollback()
             # raise e TODO handle the incorrect records in the logging
 
     def _update_field_identifiers(self, matched_document):
@@ -99,79 +148,152 @@ class DocumentImporter(object):
                 matched_document[field] = self.json_data[field]
 
         try:
-            matched_document.commit()
-            db.session.commit()
+            with db.session.begin_nested():
+                matched_document.commit()
+            if self.identifiers_index is not None:
+                self.identifiers_index.add(matched_document)
         except IlsValidationError as e:
             click.secho("Field: {}".format(e.errors[0].res["field"]), fg="red")
             click.secho(e.original_exception.message, fg="red")
-            db.session.rollback()
 
-    def search_for_matching_documents(self):
-        """Find matching documents."""
-        isbn_list = [
-            identifier["value"]
-            for identifier in self.json_data.get("identifiers", [])
-            if identifier["scheme"] == "ISBN"
+    def _identifiers_search(self):
+        """Build the search matching the document by ISBN and DOI."""
+        return search_documents_by_identifiers(
+            self.json_data.get("identifiers", [])
+        )
+
+    def _title_authors_search(self):
+        """Build the search matching the document by title and authors."""
+        is_part_of_serial = self.json_data.get("_serial", None)
+        title = self.json_data.get("title", None)
+
+        if is_part_of_serial or not title:
+            return None
+        # check by title and authors, exact matching
+        authors = [
+            author["full_name"] for author in self.json_data.get("authors", [])
         ]
+        subtitle = None
+        subtitle_obj = [
+            alt_title
+            for alt_title in self.json_data.get("alternative_titles", [])
+            if alt_title["type"] == "SUBTITLE"
+        ]
+        if subtitle_obj:
+            subtitle = subtitle_obj[0]["value"]
+
+        return search_document_by_title_authors(
+            title, authors, subtitle=subtitle
+        )
+
+    def _fuzzy_matching_search(self):
+        """Build the search finding fuzzy matches of the document."""
+        is_part_of_serial = self.json_data.get("_serial", None)
+        title = self.json_data.get("title", None)
 
-        doi_list = [
-            identifier["value"]
-            for identifier in self.json_data.get("identifiers", [])
-            if identifier["scheme"] == "DOI"
+        if is_part_of_serial or not title:
+            return None
+        authors = [
+            author["full_name"] for author in self.json_data.get("authors", [])
         ]
+        return fuzzy_search_document(title, authors)
 
+    @staticmethod
+    def _collect_matches(results):
+        """Merge the pids of the search results, keeping their order."""
         matches = []
+        for hits in results:
+            matches += [x.pid for x in hits if x.pid not in matches]
+        return matches
 
-        # check by isbn first
-        for isbn in isbn_list:
-            search = search_documents_by_isbn(isbn)
-            results = search.scan()
-            matches += [x.pid for x in results if x.pid not in matches]
+    @classmethod
+    def prefetch_matches(cls, document_importers):
+        """Resolve the matches of many documents with one request.
 
-        # check by doi
+        The identifiers, title and authors and fuzzy matching searches of
+        all the given importers are sent in a single multi search, and the
+        hits are dispatched back to each importer.
+        """
+        searches = []
+        positions = []
+        for document_importer in document_importers:
+            importer_positions = []
+            for search in (
+                document_importer._identifiers_search(),
+                document_importer._title_authors_search(),
+                document_importer._fuzzy_matching_search(),
+            ):
+                if search is None:
+                    importer_positions.append(None)
+                else:
+                    importer_positions.append(len(searches))
+                    searches.append(search)
+            positions.append(importer_positions)
 
-        for doi in doi_list:
-            search = search_documents_by_doi(doi)
-            results = search.scan()
-            matches += [x.pid for x in results if x.pid not in matches]
+        results = multi_search_documents(searches)
 
-        is_part_of_serial = self.json_data.get("_serial", None)
-        title = self.json_data.get("title", None)
-
-        if not is_part_of_serial and title:
-            # check by title and authors, exact matching
-            authors = [
-                author["full_name"]
-                for author in self.json_data.get("authors", [])
-            ]
-            subtitle = None
-            subtitle_obj = [
-                alt_title
-                for alt_title in self.json_data.get("alternative_titles", [])
-                if alt_title["type"] == "SUBTITLE"
+        for document_importer, importer_positions in zip(
+            document_importers, positions
+        ):
+            (
+                document_importer._prefetched_identifiers_matches,
+                document_importer._prefetched_title_matches,
+                document_importer._prefetched_fuzzy_matches,
+            ) = [
+                [] if position is None else results[position]
+                for position in importer_positions
             ]
-            if subtitle_obj:
-                subtitle = subtitle_obj[0]["value"]
 
-            search = search_document_by_title_authors(
-                title, authors, subtitle=subtitle
+    def invalidate_prefetched_matches(self):
+        """Search again by title and authors, e.g. after a document write.
+
+        The documents written by the previous records of the batch could
+        not be found by the prefetched searches. They are still matched by
+        identifiers, with the identifiers index.
+        """
+        if self.identifiers_index is None:
+            self._prefetched_identifiers_matches = None
+        self._prefetched_title_matches = None
+        self._prefetched_fuzzy_matches = None
+
+    def search_for_matching_documents(self):
+        """Find matching documents.
+
+        The documents written by the previous records of the task, found in
+        the identifiers index, come before the search hits.
+        """
+        matches = []
+        if self.identifiers_index is not None:
+            matches = self.identifiers_index.search(
+                self.json_data.get("identifiers", [])
             )
-            results = search.scan()
-            matches += [x.pid for x in results if x.pid not in matches]
 
-        return matches
+        results = []
+        for prefetched, build_search in (
+            (self._prefetched_identifiers_matches, self._identifiers_search),
+            (self._prefetched_title_matches, self._title_authors_search),
+        ):
+            if prefetched is not None:
+                results.append(prefetched)
+                continue
+            search = build_search()
+            if search is not None:
+                results.append(search.scan())
+        hits = self._collect_matches(results)
+        return matches + [pid for pid in hits if pid not in matches]
+
+    def forget_created_document(self):
+        """Remove the created document from the index, once rolled back."""
+        if self.identifiers_index is not None and self.created:
+            self.identifiers_index.remove(self.created["pid"])
+        self.created = None
 
     def fuzzy_match_documents(self):
         """Fuzzy search documents."""
-        is_part_of_serial = self.json_data.get("_serial", None)
-        title = self.json_data.get("title", None)
+        if self._prefetched_fuzzy_matches is not None:
+            return self._prefetched_fuzzy_matches
 
-        if is_part_of_serial or not title:
+        fuzzy_search = self._fuzzy_matching_search()
+        if fuzzy_search is None:
             return []
-        authors = [
-            author["full_name"] for author in self.json_data.get("authors", [])
-        ]
-
-        fuzzy_results = fuzzy_search_document(title, authors).scan()
-
-        return fuzzy_results
+        return fuzzy_search.scan()
@@ -16,3 +16,25 @@ def get_eitems_for_document_by_provider(document_pid, provider):
         document_pid=document_pid
     ).filter("term", created_by__value=provider)
     return search
+
+
+def get_eitems_records(search, size=100):
+    """Return the records of the eitems matched by a search.
+
+    The hits are fetched with a single search request, unless there are
+    more than ``size`` of them which are then scanned. Their records are
+    loaded with a single database query, in the order of the hits.
+    """
+    response = search[:size].execute()
+    hits = response.hits
+    if response.hits.total.value > len(response.hits):
+        hits = search.scan()
+    ids = [hit.meta.id for hit in hits]
+    if not ids:
+        return []
+
+    eitem_cls = current_app_ils.eitem_record_cls
+    records = {
+        str(record.id): record for record in eitem_cls.get_records(ids)
+    }
+    return [records[id_] for id_ in ids if id_ in records]
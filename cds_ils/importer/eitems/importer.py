@@ -16,7 +16,8 @@ from invenio_app_ils.errors import IlsValidationError
 from invenio_app_ils.proxies import current_app_ils
 from invenio_db import db
 
-from cds_ils.importer.eitems.api import get_eitems_for_document_by_provider
+from cds_ils.importer.eitems.api import get_eitems_for_document_by_provider, \
+    get_eitems_records
 
 
 class EItemImporter(object):
@@ -30,6 +31,7 @@ class EItemImporter(object):
         provider_priority_sensitive,
         open_access,
         login_required,
+        bulk_indexer=None,
     ):
         """Constructor."""
         self.json_data = json_metadata
@@ -38,6 +40,7 @@ class EItemImporter(object):
         self.is_provider_priority_sensitive = provider_priority_sensitive
         self.open_access = open_access
         self.login_required = login_required
+        self.bulk_indexer = bulk_indexer
 
         self.created = None
         self.updated = None
@@ -75,43 +78,41 @@ class EItemImporter(object):
         metadata_to_update = {}
         self._build_eitem_dict(metadata_to_update, matched_document["pid"])
         try:
-            existing_eitem.update(metadata_to_update)
-            existing_eitem.commit()
-            db.session.commit()
+            with db.session.begin_nested():
+                existing_eitem.update(metadata_to_update)
+                existing_eitem.commit()
             return existing_eitem
         except IlsValidationError as e:
-            db.session.rollback()
             click.secho("Field: {}".format(e.errors[0].res["field"]), fg="red")
             click.secho(e.original_exception.message, fg="red")
 
+    def _delete_from_index(self, eitem):
+        """Delete the eitem from the index, once committed if bulk."""
+        if self.bulk_indexer is not None:
+            self.bulk_indexer.delete_eitems(eitem)
+        else:
+            current_app_ils.eitem_indexer.delete(eitem)
+
     def _delete_existing_record(self, existing_eitem):
-        eitem_indexer = current_app_ils.eitem_indexer
-        existing_eitem.delete(force=True)
-        db.session.commit()
-        eitem_indexer.delete(existing_eitem)
+        with db.session.begin_nested():
+            existing_eitem.delete(force=True)
+        self._delete_from_index(existing_eitem)
         return existing_eitem
 
-    def _report_ambiguous_records(self, multiple_results):
-        eitem_cls = current_app_ils.eitem_record_cls
-
-        for hit in multiple_results:
-            existing_eitem = eitem_cls.get_record_by_pid(hit["pid"])
-            self.ambiguous_list.append(existing_eitem)
+    def _report_ambiguous_records(self, existing_eitems):
+        self.ambiguous_list.extend(existing_eitems)
 
     def _replace_lower_priority_eitems(self, matched_document):
-        eitem_indexer = current_app_ils.eitem_indexer
         eitem_search = current_app_ils.eitem_search_cls()
-        eitem_cls = current_app_ils.eitem_record_cls
 
-        document_eitems = eitem_search.search_by_document_pid(
-            matched_document["pid"]
+        document_eitems = get_eitems_records(
+            eitem_search.search_by_document_pid(matched_document["pid"])
         )
-        for hit in document_eitems:
-            eitem = eitem_cls.get_record_by_pid(hit.pid)
+        for eitem in document_eitems:
             if self._should_replace_eitems(eitem):
                 self.deleted_list.append(eitem)
                 eitem.delete()
-                eitem_indexer.delete(eitem)
+                self._delete_from_index(eitem)
 
     def _build_eitem_dict(self, eitem_json, document_pid):
         """Provide initial metadata dictionary."""
@@ -143,47 +144,41 @@ class EItemImporter(object):
 
     def update_eitems(self, matched_document):
         """Update eitems for a given document."""
-        eitem_cls = current_app_ils.eitem_record_cls
         document_pid = matched_document["pid"]
 
         # get eitems for current provider
-        search = get_eitems_for_document_by_provider(
-            document_pid, self.metadata_provider
+        existing_eitems = get_eitems_records(
+            get_eitems_for_document_by_provider(
+                document_pid, self.metadata_provider
+            )
         )
-        results = search.scan()
-        hits_total = search.count()
 
-        if hits_total == 0:
+        if len(existing_eitems) == 0:
             self.created = self.create_eitem(matched_document)
-        elif hits_total == 1:
-            record = [result for result in results][0]
-            existing_eitem = eitem_cls.get_record_by_pid(record["pid"])
+        elif len(existing_eitems) == 1:
             self.updated = self._update_existing_record(
-                existing_eitem, matched_document
+                existing_eitems[0], matched_document
             )
         else:
-            self._report_ambiguous_records(results)
+            self._report_ambiguous_records(existing_eitems)
             self.created = self.create_eitem(matched_document)
         if self.is_provider_priority_sensitive:
             self._replace_lower_priority_eitems(matched_document)
 
     def delete_eitems(self, matched_document):
         """Deltes eitems for a given document."""
-        eitem_cls = current_app_ils.eitem_record_cls
         document_pid = matched_document["pid"]
 
         # get eitems for current provider
-        search = get_eitems_for_document_by_provider(
-            document_pid, self.metadata_provider
+        existing_eitems = get_eitems_records(
+            get_eitems_for_document_by_provider(
+                document_pid, self.metadata_provider
+            )
         )
-        results = search.scan()
-        hits_total = search.count()
 
-        if hits_total > 0:
-            record = [result for result in results][0]
-            existing_eitem = eitem_cls.get_record_by_pid(record["pid"])
+        if existing_eitems:
             self.deleted_list.append(
-                self._delete_existing_record(existing_eitem)
+                self._delete_existing_record(existing_eitems[0])
             )
 
     def create_eitem(self, new_document):
@@ -202,12 +197,10 @@ class EItemImporter(object):
 
                     eitem_json["pid"] = provider.pid.pid_value
                     self.created = eitem_cls.create(eitem_json, record_uuid)
-                db.session.commit()
                 return self.created
             except IlsValidationError as e:
                 click.secho(
                     "Field: {}".format(e.errors[0].res["field"]), fg="red"
                 )
                 click.secho(e.original_exception.message, fg="red")
-                db.session.rollback()
                 raise e
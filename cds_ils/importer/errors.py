@@ -41,6 +41,41 @@ class ProviderNotAllowedDeletion(DoJSONException):
         super().__init__(*args, **kwargs)
 
 
+class UnknownProvider(DoJSONException):
+    """Provider has no registered importer."""
+
+    def __init__(self, *args, **kwargs):
+        """Exception custom initialisation."""
+        self.provider = kwargs.pop("provider", None)
+        self.message = "Unknown provider {0}".format(self.provider)
+        super().__init__(*args, **kwargs)
+
+
+class ImporterTaskNotResumable(DoJSONException):
+    """Import task cannot be resumed."""
+
+    def __init__(self, *args, **kwargs):
+        """Exception custom initialisation."""
+        self.log_id = kwargs.pop("log_id", None)
+        self.message = "Import task {0} cannot be resumed".format(
+            self.log_id
+        )
+        super().__init__(*args, **kwargs)
+
+
+class SourceFileTooLarge(DoJSONException):
+    """Decompressed source file exceeding the allowed size."""
+
+    def __init__(self, *args, **kwargs):
+        """Exception custom initialisation."""
+        self.filename = kwargs.pop("filename", None)
+        self.max_size = kwargs.pop("max_size", None)
+        self.message = "File {0} exceeds {1} bytes once decompressed".format(
+            self.filename, self.max_size
+        )
+        super().__init__(*args, **kwargs)
+
+
 class CDSImporterException(DoJSONException):
     """CDSDoJSONException class."""
 
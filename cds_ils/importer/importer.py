@@ -30,10 +30,12 @@ class Importer(object):
         "provider_recid",
     )
 
-    def __init__(self, json_data, metadata_provider):
+    def __init__(self, json_data, metadata_provider, bulk_indexer=None,
+                 series_cache=None, identifiers_index=None):
         """Constructor."""
         self.json_data = json_data
         self.metadata_provider = metadata_provider
+        self.bulk_indexer = bulk_indexer
         priority = current_app.config["CDS_ILS_IMPORTER_PROVIDERS"][
             metadata_provider
         ]["priority"]
@@ -42,6 +44,7 @@ class Importer(object):
             self.HELPER_METADATA_FIELDS,
             metadata_provider,
             self.UPDATE_DOCUMENT_FIELDS,
+            identifiers_index=identifiers_index,
         )
         self.eitem_importer = EItemImporter(
             json_data,
@@ -50,9 +53,12 @@ class Importer(object):
             self.IS_PROVIDER_PRIORITY_SENSITIVE,
             self.EITEM_OPEN_ACCESS,
             self.EITEM_URLS_LOGIN_REQUIRED,
+            bulk_indexer=bulk_indexer,
         )
         series_json = json_data.get("_serial", None)
-        self.series_importer = SeriesImporter(series_json, metadata_provider)
+        self.series_importer = SeriesImporter(
+            series_json, metadata_provider, matches_cache=series_cache
+        )
 
         self.ambiguous_matches = []
         self.created = None
@@ -109,16 +115,34 @@ class Importer(object):
         if self.eitem_importer.deleted_list:
             self.updated = matched_document
 
+    def forget_created_records(self):
+        """Remove the created records from the task caches, on rollback."""
+        self.document_importer.forget_created_document()
+        self.series_importer.forget_created_series()
+
     def index_all_records(self):
-        """Index imported records."""
+        """Index imported records.
+
+        When a bulk indexer is given, the records are only collected to be
+        indexed once committed.
+        """
+        eitem = self.eitem_importer.updated or self.eitem_importer.created
+        document = self.created or self.updated
+
+        if self.bulk_indexer is not None:
+            if eitem:
+                self.bulk_indexer.add_eitems(eitem)
+            self.bulk_indexer.add_documents(document)
+            self.bulk_indexer.add_series(*self.series_list)
+            return
+
         document_indexer = current_app_ils.document_indexer
         series_indexer = current_app_ils.series_indexer
         eitem_indexer = current_app_ils.eitem_indexer
 
-        eitem = self.eitem_importer.updated or self.eitem_importer.created
         if eitem:
             eitem_indexer.index(eitem)
-        document_indexer.index(self.created or self.updated)
+        document_indexer.index(document)
         for series in self.series_list:
             series_indexer.index(series)
 
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# CDS-ILS is free software; you can redistribute it and/or modify it under
+# the terms of the MIT License; see LICENSE file for more details.
+
+"""CDS-ILS Importer bulk indexer."""
+
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+from elasticsearch.helpers import bulk
+from flask import current_app
+from invenio_app_ils.documents.indexer import \
+    index_referenced_records as index_document_references
+from invenio_app_ils.eitems.indexer import \
+    index_referenced_records as index_eitem_references
+from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.series.indexer import \
+    index_referenced_records as index_series_references
+from invenio_search import current_search, current_search_client
+
+records_logger = logging.getLogger("records_errored")
+
+
+class ImporterBulkIndexer(object):
+    """Collect the records touched by an import and index them at once.
+
+    The operations collected since the last commit are kept by `commit`,
+    or dropped by `discard` when the transaction is rolled back, so that
+    the indices never contain records which are not committed. The index
+    actions are built by the ILS indexer of each record and sent in
+    bulk requests, without going through the indexer message queue. The
+    records referencing them are then indexed asynchronously, as the ILS
+    indexers do after indexing a record.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.records = {}
+        self.deleted = {}
+        # operations not committed yet, by savepoint, see `begin_nested`
+        self.savepoints = [[]]
+
+    def _add(self, operation):
+        """Collect an operation of the current savepoint."""
+        self.savepoints[-1].append(operation)
+
+    def _add_records(self, indexer, index_references, records):
+        """Defer the indexing of records, keeping their last version."""
+        for record in records:
+            self._add((
+                "index", str(record.id), (indexer, index_references, record)
+            ))
+
+    def add_documents(self, *documents):
+        """Defer the indexing of the given documents."""
+        self._add_records(
+            current_app_ils.document_indexer, index_document_references,
+            documents,
+        )
+
+    def add_eitems(self, *eitems):
+        """Defer the indexing of the given eitems."""
+        self._add_records(
+            current_app_ils.eitem_indexer, index_eitem_references, eitems
+        )
+
+    def add_series(self, *series):
+        """Defer the indexing of the given series."""
+        self._add_records(
+            current_app_ils.series_indexer, index_series_references, series
+        )
+
+    def delete_eitems(self, *eitems):
+        """Defer the removal of the given eitems from the index."""
+        for eitem in eitems:
+            self._add((
+                "delete", str(eitem.id),
+                (current_app_ils.eitem_indexer, eitem),
+            ))
+
+    @contextmanager
+    def begin_nested(self):
+        """Collect the operations of a savepoint.
+
+        The operations are discarded if the savepoint is rolled back, i.e.
+        if an exception is raised.
+        """
+        self.savepoints.append([])
+        try:
+            yield
+        except Exception:
+            self.savepoints.pop()
+            raise
+        operations = self.savepoints.pop()
+        self.savepoints[-1].extend(operations)
+
+    def commit(self):
+        """Keep the collected operations, once committed."""
+        for savepoint in self.savepoints:
+            for action, record_id, value in savepoint:
+                if action == "index":
+                    self.deleted.pop(record_id, None)
+                    self.records[record_id] = value
+                else:
+                    self.records.pop(record_id, None)
+                    self.deleted[record_id] = value
+        self.savepoints = [[]]
+
+    def discard(self):
+        """Forget the operations not committed, once rolled back."""
+        self.savepoints = [[]]
+
+    @property
+    def record_ids(self):
+        """Return the ids of the committed records to index."""
+        return set(self.records)
+
+    def flush(self):
+        """Apply the committed operations and refresh the indices once."""
+        if not self.records and not self.deleted:
+            return
+
+        records = list(self.records.values())
+        deleted = list(self.deleted.values())
+        self.records = {}
+        self.deleted = {}
+        actions = (
+            indexer._index_action(dict(id=str(record.id)))
+            for indexer, _, record in records
+        )
+        _, errors = bulk(
+            current_search_client, actions, raise_on_error=False
+        )
+        for error in errors:
+            records_logger.error(
+                "@UUID: {0} INDEXING ERROR: {1}".format(
+                    error.get("index", {}).get("_id"),
+                    error.get("index", {}).get("error"),
+                )
+            )
+        for indexer, record in deleted:
+            try:
+                indexer.delete(record)
+            except Exception as e:
+                records_logger.error(
+                    "@UUID: {0} DELETION ERROR: {1}".format(record.id, e)
+                )
+
+        for search_cls in (
+            current_app_ils.document_search_cls,
+            current_app_ils.eitem_search_cls,
+            current_app_ils.series_search_cls,
+        ):
+            current_search.flush_and_refresh(index=search_cls.Meta.index)
+
+        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
+        for _, index_references, record in records:
+            index_references.apply_async((record,), eta=eta)
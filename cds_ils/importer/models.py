@@ -8,10 +8,18 @@
 """Database models for importer."""
 
 import enum
-from datetime import datetime
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
 
+from flask import current_app
 from invenio_db import db
 from sqlalchemy import Enum
+from sqlalchemy.dialects import postgresql
+
+from cds_ils.importer.errors import ImporterTaskNotResumable
 
 
 def _format_exception(exception):
@@ -83,6 +91,9 @@ class ImporterTaskLog(db.Model):
     original_filename = db.Column(db.String, nullable=False)
     """The original name of the imported file."""
 
+    source_path = db.Column(db.String, nullable=True)
+    """The path of the stored source file, to resume the task."""
+
     start_time = db.Column(
         db.DateTime, nullable=False, default=lambda: datetime.now()
     )
@@ -91,12 +102,61 @@ class ImporterTaskLog(db.Model):
     end_time = db.Column(db.DateTime, nullable=True)
     """Task end time (if not currently running)."""
 
+    heartbeat_time = db.Column(
+        db.DateTime, nullable=True, default=lambda: datetime.now()
+    )
+    """Time of the last progress of the task, while running."""
+
     message = db.Column(db.String, nullable=True)
     """Message in case of an error."""
 
     entries_count = db.Column(db.Integer, nullable=True)
     """Number of entries in source file."""
 
+    chunks_count = db.Column(db.Integer, nullable=True)
+    """Number of chunks processed in parallel (if the task was split)."""
+
+    finished_chunks = db.Column(db.Integer, nullable=False, default=0)
+    """Number of chunks whose processing has ended."""
+
+    failed_chunks = db.Column(db.Integer, nullable=False, default=0)
+    """Number of chunks whose processing was aborted due to an error."""
+
+    profile = db.Column(db.JSON, nullable=True)
+    """Cost of each conversion rule, if the task was profiled."""
+
+    loaded_entries = db.Column(db.Integer, nullable=False, default=0)
+    """Number of entries written, whatever their outcome."""
+
+    created_entries = db.Column(db.Integer, nullable=False, default=0)
+    """Number of entries which created a document."""
+
+    updated_entries = db.Column(db.Integer, nullable=False, default=0)
+    """Number of entries which updated a document."""
+
+    unchanged_entries = db.Column(db.Integer, nullable=False, default=0)
+    """Number of entries unchanged since their last import."""
+
+    ambiguous_entries = db.Column(db.Integer, nullable=False, default=0)
+    """Number of entries matching several documents."""
+
+    fuzzy_entries = db.Column(db.Integer, nullable=False, default=0)
+    """Number of entries with fuzzy matching documents."""
+
+    failed_entries = db.Column(db.Integer, nullable=False, default=0)
+    """Number of entries which failed to be imported."""
+
+    ENTRIES_COUNTERS = {
+        "loaded_entries": lambda entry: True,
+        "created_entries": lambda entry: entry.get("created_document"),
+        "updated_entries": lambda entry: entry.get("updated_document"),
+        "unchanged_entries": lambda entry: entry.get("unchanged"),
+        "ambiguous_entries": lambda entry: entry.get("ambiguous_documents"),
+        "fuzzy_entries": lambda entry: entry.get("fuzzy_documents"),
+        "failed_entries": lambda entry: entry.get("error"),
+    }
+    """Counters of the entries, with the entries they count."""
+
     @classmethod
     def create(cls, data):
         """Create a new task log."""
@@ -124,6 +184,140 @@ class ImporterTaskLog(db.Model):
         self.message = _format_exception(exception)
         db.session.commit()
 
+    def is_stale(self):
+        """Check if the task is running without progress, e.g. killed.
+
+        A running task is stale once it has not written any entry nor ended
+        any chunk for ``CDS_ILS_IMPORTER_RESUME_TIMEOUT`` seconds.
+        """
+        timeout = current_app.config["CDS_ILS_IMPORTER_RESUME_TIMEOUT"]
+        heartbeat_time = self.heartbeat_time or self.start_time
+        return self.is_running() and \
+            datetime.now() - heartbeat_time > timedelta(seconds=timeout)
+
+    def is_resumable(self, force=False):
+        """Check if the task can be resumed from its stored source file.
+
+        Only the failed and stale tasks can be resumed, as the records of a
+        task still running would be imported twice.
+
+        :param force: resume any task which did not succeed, e.g. a running
+            task whose process is known to be dead.
+        """
+        if self.status == ImporterTaskStatus.SUCCEEDED or \
+                not self.source_path or \
+                not os.path.exists(self.source_path):
+            return False
+        return force or self.status == ImporterTaskStatus.FAILED or \
+            self.is_stale()
+
+    def set_resumed(self, force=False):
+        """Mark this task as running again, before resuming it.
+
+        The task row is locked and checked again, so that a task is not
+        resumed twice, nor while its last chunks are still ending.
+        """
+        db.session.refresh(self, with_for_update=True)
+        if not self.is_resumable(force=force):
+            db.session.rollback()
+            raise ImporterTaskNotResumable(log_id=self.id)
+        self.status = ImporterTaskStatus.RUNNING
+        self.heartbeat_time = datetime.now()
+        self.end_time = None
+        self.message = None
+        self.chunks_count = None
+        self.finished_chunks = 0
+        self.failed_chunks = 0
+        db.session.commit()
+
+    def unprocessed_ranges(self):
+        """Return the ranges of the source records without a task entry.
+
+        The entries are committed together with their records, so these
+        are the records still to import when the task was interrupted.
+        """
+        ranges = []
+        start = 0
+        indexes = db.session.query(ImporterTaskEntry.entry_index) \
+            .filter(ImporterTaskEntry.import_id == self.id) \
+            .order_by(ImporterTaskEntry.entry_index.asc()) \
+            .yield_per(10000)
+        for index, in indexes:
+            if index > start:
+                ranges.append((start, index))
+            start = index + 1
+        if start < self.entries_count:
+            ranges.append((start, self.entries_count))
+        return ranges
+
+    def get_counters(self):
+        """Return the counters of the entries of the task."""
+        return {name: getattr(self, name) for name in self.ENTRIES_COUNTERS}
+
+    @classmethod
+    def count_entries(cls, entries):
+        """Add the given entries to the counters of their tasks.
+
+        The counters are incremented by the database, so that the entries
+        written by concurrent chunks are all counted. The entries are then
+        numbered after the entries already counted: the task row stays
+        locked by the update until the entries are committed, so that
+        their positions follow the order in which they are committed.
+        """
+        increments = {}
+        for entry in entries:
+            counters = increments.setdefault(
+                entry["import_id"], dict.fromkeys(cls.ENTRIES_COUNTERS, 0)
+            )
+            for name, counts in cls.ENTRIES_COUNTERS.items():
+                if counts(entry):
+                    counters[name] += 1
+
+        positions = {}
+        for import_id, counters in increments.items():
+            cls.query.filter_by(id=import_id).update(
+                {
+                    cls.heartbeat_time: datetime.now(),
+                    **{
+                        getattr(cls, name): getattr(cls, name) + increment
+                        for name, increment in counters.items()
+                        if increment
+                    },
+                },
+                synchronize_session=False,
+            )
+            loaded_entries = db.session.query(cls.loaded_entries) \
+                .filter_by(id=import_id).scalar()
+            positions[import_id] = \
+                loaded_entries - counters["loaded_entries"]
+
+        for entry in entries:
+            entry["position"] = positions[entry["import_id"]]
+            positions[entry["import_id"]] += 1
+
+    @classmethod
+    def finish_chunk(cls, log_id, exception=None):
+        """Mark a chunk as ended and the task as complete after the last one.
+
+        The task row is locked, so that concurrent chunks are counted once.
+        """
+        log = cls.query.filter_by(id=log_id).with_for_update().one()
+        log.heartbeat_time = datetime.now()
+        log.finished_chunks += 1
+        if exception:
+            log.failed_chunks += 1
+            # keep the error of the first failed chunk
+            log.message = log.message or _format_exception(exception)
+        if log.finished_chunks < log.chunks_count or not log.is_running():
+            # the task may have already ended, e.g. failing to dispatch
+            # its other chunks
+            db.session.commit()
+            return
+        log.status = ImporterTaskStatus.FAILED if log.failed_chunks \
+            else ImporterTaskStatus.SUCCEEDED
+        log.end_time = datetime.now()
+        db.session.commit()
+
 
 class ImporterTaskEntry(db.Model):
     """An entry."""
@@ -131,7 +325,10 @@ class ImporterTaskEntry(db.Model):
     __tablename__ = "import_task_entry"
 
     # Ensure the entries are uniquely defined
-    __table_args__ = (db.PrimaryKeyConstraint('import_id', 'entry_index'),)
+    __table_args__ = (
+        db.PrimaryKeyConstraint('import_id', 'entry_index'),
+        db.Index('idx_import_task_entry_position', 'import_id', 'position'),
+    )
 
     import_id = db.Column(db.Integer, db.ForeignKey('importer_task.id'))
     """The parent task."""
@@ -139,6 +336,9 @@ class ImporterTaskEntry(db.Model):
     entry_index = db.Column(db.Integer, nullable=False)
     """The index of the entry in the source."""
 
+    position = db.Column(db.Integer, nullable=True)
+    """The order in which the entry was committed within its task."""
+
     error = db.Column(db.String, nullable=True)
     """In case of an error."""
 
@@ -160,48 +360,184 @@ class ImporterTaskEntry(db.Model):
 
     fuzzy_documents = db.Column(db.JSON, nullable=True)
 
+    unchanged = db.Column(db.Boolean, nullable=True)
+    """The record was skipped, unchanged since its last import."""
+
     importer_task = db.relationship(
         ImporterTaskLog,
         backref=db.backref('entries', lazy='dynamic')
     )
     """Relationship."""
 
-    @classmethod
-    def __create(cls, data):
-        """Create a new entry."""
-        entry = cls(**data)
-        db.session.add(entry)
-        db.session.commit()
-        return entry
+    @staticmethod
+    def success_data(base_data, report):
+        """Build the columns of a successfully imported record."""
+        return {
+            **base_data,
+            **dict(
+                ambiguous_documents=report["ambiguous_documents"],
+                ambiguous_eitems=report["ambiguous_eitem_list"],
+                created_document=report["created"],
+                created_eitem=report["created_eitem"],
+                updated_document=report["updated"],
+                updated_eitem=report["updated_eitem"],
+                deleted_eitems=report["deleted_eitem_list"],
+                series=report["series"],
+                fuzzy_documents=report["fuzzy"],
+            ),
+        }
+
+    @staticmethod
+    def unchanged_data(base_data):
+        """Build the columns of a record unchanged since its last import."""
+        return {**base_data, **dict(unchanged=True)}
+
+    @staticmethod
+    def failure_data(base_data, exception):
+        """Build the columns of a failed record."""
+        return {
+            **base_data,
+            **dict(
+                error=_format_exception(exception)
+            )
+        }
+
+
+class ImporterTaskEntryWriter(object):
+    """Buffer the entries of a task and insert them in bulk."""
+
+    def __init__(self, flush_size, flush_interval, on_entry=None):
+        """Constructor.
+
+        :param flush_size: number of buffered entries to insert at once.
+        :param flush_interval: seconds after which the buffered entries are
+            inserted, whatever their number.
+        :param on_entry: function called with each added entry, e.g. to
+            report the progress of the task.
+        """
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.on_entry = on_entry
+        self.entries = []
+        self.last_flush = time.monotonic()
+
+    def _add(self, entry):
+        """Buffer an entry."""
+        self.entries.append(entry)
+        if self.on_entry is not None:
+            self.on_entry(entry)
+
+    def add_success(self, base_data, report):
+        """Buffer the entry of a successfully imported record."""
+        self._add(ImporterTaskEntry.success_data(base_data, report))
+
+    def add_unchanged(self, base_data):
+        """Buffer the entry of a record unchanged since its last import."""
+        self._add(ImporterTaskEntry.unchanged_data(base_data))
+
+    def add_failure(self, base_data, exception):
+        """Buffer the entry of a failed record."""
+        self._add(ImporterTaskEntry.failure_data(base_data, exception))
+
+    def is_due(self):
+        """Check if the buffered entries should be inserted."""
+        elapsed = time.monotonic() - self.last_flush
+        return len(self.entries) >= self.flush_size or (
+            bool(self.entries) and elapsed >= self.flush_interval
+        )
+
+    def flush(self):
+        """Insert the buffered entries, committed with the session.
+
+        The counters of their tasks are updated in the same transaction,
+        numbering the entries, see `ImporterTaskLog.count_entries`.
+        """
+        if self.entries:
+            ImporterTaskLog.count_entries(self.entries)
+            db.session.bulk_insert_mappings(ImporterTaskEntry, self.entries)
+            self.entries = []
+        self.last_flush = time.monotonic()
+
+
+class ImportedRecordFingerprint(db.Model):
+    """Fingerprint of the last imported version of a provider record."""
+
+    __tablename__ = "importer_record_fingerprint"
+
+    __table_args__ = (
+        db.PrimaryKeyConstraint("provider", "provider_recid"),
+    )
+
+    provider = db.Column(db.String, nullable=False)
+    """The provider of the record."""
+
+    provider_recid = db.Column(db.String, nullable=False)
+    """The identifier of the record at the provider."""
+
+    fingerprint = db.Column(db.String(64), nullable=False)
+    """The hash of the converted record."""
+
+    updated = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(),
+        onupdate=lambda: datetime.now()
+    )
+    """Time of the last import of the record."""
+
+    @staticmethod
+    def compute(json_data):
+        """Compute the fingerprint of a converted record.
+
+        The record is serialized with sorted keys, so that the fingerprint
+        does not depend on the order of the fields.
+        """
+        normalized = json.dumps(
+            json_data, sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
 
     @classmethod
-    def create_success(cls, base_data, report):
-        """Mark this record as successfully imported."""
-        return cls.__create(
-            {
-                **base_data,
-                **dict(
-                    ambiguous_documents=report["ambiguous_documents"],
-                    ambiguous_eitems=report["ambiguous_eitem_list"],
-                    created_document=report["created"],
-                    created_eitem=report["created_eitem"],
-                    updated_document=report["updated"],
-                    updated_eitem=report["updated_eitem"],
-                    deleted_eitems=report["deleted_eitem_list"],
-                    series=report["series"],
-                    fuzzy_documents=report["fuzzy"],
-                ),
-            }
+    def get_fingerprints(cls, provider, provider_recids):
+        """Return the stored fingerprints of the given records."""
+        if not provider_recids:
+            return {}
+        rows = db.session.query(cls.provider_recid, cls.fingerprint).filter(
+            cls.provider == provider,
+            cls.provider_recid.in_(provider_recids),
         )
+        return dict(rows)
 
     @classmethod
-    def create_failure(cls, base_data, exception):
-        """Mark this record as failed."""
-        return cls.__create(
-            {
-                **base_data,
-                **dict(
-                    error=_format_exception(exception)
-                )
-            }
+    def store(cls, provider, provider_recid, fingerprint):
+        """Store the fingerprint of an imported record.
+
+        The fingerprint is upserted in a single statement on PostgreSQL, so
+        that the chunks of a task importing the same record concurrently do
+        not both try to insert it.
+        """
+        if db.session.bind.dialect.name != "postgresql":
+            db.session.merge(cls(
+                provider=provider,
+                provider_recid=provider_recid,
+                fingerprint=fingerprint,
+            ))
+            return
+
+        statement = postgresql.insert(cls.__table__).values(
+            provider=provider,
+            provider_recid=provider_recid,
+            fingerprint=fingerprint,
         )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[cls.provider, cls.provider_recid],
+            set_=dict(
+                fingerprint=statement.excluded.fingerprint,
+                updated=datetime.now(),
+            ),
+        ))
+
+    @classmethod
+    def forget(cls, provider, provider_recid):
+        """Forget the fingerprint of a record, to import it again."""
+        cls.query.filter_by(
+            provider=provider, provider_recid=provider_recid
+        ).delete()
@@ -7,15 +7,108 @@
 
 """CDS-ILS Overdo module."""
 
+import threading
+import time
+
 from cds_dojson.overdo import Overdo
+from cds_dojson.utils import MementoDict, not_accessed_keys
 from dojson._compat import iteritems
 from dojson.errors import IgnoreKey, MissingRule
 from dojson.utils import GroupableOrderedDict
 
+_profiling = threading.local()
+
+
+class RuleProfiler(object):
+    """Collect the cost of the conversion rules applied in this thread.
+
+    Usage::
+
+        with RuleProfiler() as profiler:
+            model.do(blob)
+        profiler.report()
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.stats = {}
+
+    def __enter__(self):
+        """Profile the rules applied by the models from now on."""
+        _profiling.profiler = self
+        return self
+
+    def __exit__(self, *args):
+        """Stop profiling."""
+        _profiling.profiler = None
+
+    @staticmethod
+    def current():
+        """Return the profiler active in this thread, if any."""
+        return getattr(_profiling, "profiler", None)
+
+    def add(self, model, key, creator, elapsed, failed):
+        """Account a call of a rule."""
+        stat = self.stats.setdefault(
+            (model.__class__.__name__, key, creator),
+            dict(calls=0, time=0.0, exceptions=0),
+        )
+        stat["calls"] += 1
+        stat["time"] += elapsed
+        if failed:
+            stat["exceptions"] += 1
+
+    def report(self):
+        """Return the stats per model, MARC tag and rule, slowest first."""
+        report = [
+            dict(
+                model=model,
+                tag=key,
+                rule="{0}.{1}".format(creator.__module__, creator.__name__),
+                calls=stat["calls"],
+                time=round(stat["time"], 6),
+                exceptions=stat["exceptions"],
+            )
+            for (model, key, creator), stat in self.stats.items()
+        ]
+        return sorted(report, key=lambda stat: stat["time"], reverse=True)
+
 
 class CdsIlsOverdo(Overdo):
     """Overwrite API of Overdo dojson class."""
 
+    def build(self):
+        """Build the rules index and reset the dispatch cache."""
+        super().build()
+        self._dispatch = {}
+
+    def query(self, key):
+        """Return the rule matching the key, caching the index lookup."""
+        try:
+            return self._dispatch[key]
+        except KeyError:
+            result = self._dispatch[key] = self.index.query(key)
+            return result
+
+    def apply(self, creator, output, key, value, profiler=None):
+        """Apply a rule, accounting its cost to the profiler if any."""
+        if profiler is None:
+            return creator(output, key, value)
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            data = creator(output, key, value)
+            failed = False
+            return data
+        except IgnoreKey:
+            failed = False
+            raise
+        finally:
+            profiler.add(
+                self, key, creator, time.perf_counter() - start, failed
+            )
+
     def do(
         self,
         blob,
@@ -36,6 +129,12 @@ class CdsIlsOverdo(Overdo):
         :param exception_handlers: Give custom exception handlers to take care
                                    of non-standard codes that are installation
                                    specific.
+
+        When the blob remembers the accessed keys, the keys not consumed by
+        any rule are recorded on it while translating, so that ``missing``
+        does not need to walk the record again.
+
+        The rules are profiled when a ``RuleProfiler`` is active.
         """
         handlers = {IgnoreKey: None}
         handlers.update(exception_handlers or {})
@@ -61,14 +160,18 @@ class CdsIlsOverdo(Overdo):
         else:
             items = iteritems(blob)
 
+        record_missing = isinstance(blob, MementoDict)
+        missing = set()
+        profiler = RuleProfiler.current()
+
         for key, value in items:
             try:
-                result = self.index.query(key)
+                result = self.query(key)
                 if not result:
                     raise MissingRule(key)
 
                 name, creator = result
-                data = creator(output, key, value)
+                data = self.apply(creator, output, key, value, profiler)
                 if getattr(creator, "__extend__", False):
                     existing = output.get(name, [])
                     existing.extend(data)
@@ -82,4 +185,18 @@ class CdsIlsOverdo(Overdo):
                         handler(exc, output, key, value)
                 else:
                     raise
+            if record_missing:
+                missing.update(
+                    "{0}{1}".format(key, subfield)
+                    for subfield in not_accessed_keys(value)
+                )
+        if record_missing:
+            blob.missing_keys = missing - self.__class__.__ignore_keys__
         return output
+
+    def missing(self, blob, **kwargs):
+        """Return keys with missing rules."""
+        missing_keys = getattr(blob, "missing_keys", None)
+        if missing_keys is None:
+            return super().missing(blob, **kwargs)
+        return set(missing_keys)
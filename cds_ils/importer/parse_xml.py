@@ -6,15 +6,171 @@
 # the terms of the MIT License; see LICENSE file for more details.
 
 """CDS-ILS Importer xml parser module."""
+import gzip
+import os
+import tempfile
+import zipfile
+from contextlib import contextmanager
+
 from flask import current_app
 from lxml import etree
 
+from cds_ils.importer.errors import SourceFileTooLarge
+
 
 def get_records_list(xml_file):
-    """Generate list of isolated records."""
-    record_tag_path = current_app.config["CDS_ILS_IMPORTER_RECORD_TAG"]
+    """Generate isolated records, parsing the file incrementally."""
+    record_tag = current_app.config["CDS_ILS_IMPORTER_RECORD_TAG"]
 
-    root = etree.parse(xml_file).getroot()
-    # namespaced XMLs
-    for record in root.xpath(record_tag_path):
+    for _, record in etree.iterparse(xml_file, events=("end",),
+                                     tag=record_tag):
         yield record
+        # free the consumed record and its already processed siblings, so
+        # that the parsed tree does not grow with the size of the file
+        record.clear()
+        while record.getprevious() is not None:
+            del record.getparent()[0]
+
+
+class SizeLimitedFile(object):
+    """Read a decompressed file, failing once it exceeds a size.
+
+    The declared size of compressed files cannot be trusted, so the
+    decompressed bytes are counted while they are read.
+    """
+
+    def __init__(self, fileobj, name, max_size):
+        """Constructor."""
+        self.fileobj = fileobj
+        self.name = name
+        self.max_size = max_size
+        self.size = 0
+
+    def read(self, size=-1):
+        """Read the next decompressed bytes."""
+        data = self.fileobj.read(size)
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise SourceFileTooLarge(
+                filename=self.name, max_size=self.max_size
+            )
+        return data
+
+
+def _iter_archive_files(archive, max_size):
+    """Open the XML files of a zip archive one after the other."""
+    for info in archive.infolist():
+        if not info.is_dir() and info.filename.lower().endswith(".xml"):
+            if info.file_size > max_size:
+                raise SourceFileTooLarge(
+                    filename=info.filename, max_size=max_size
+                )
+            with archive.open(info) as xml_file:
+                yield SizeLimitedFile(xml_file, info.filename, max_size)
+
+
+@contextmanager
+def open_source(source_path):
+    """Open the XML files of a source, decompressed on the fly.
+
+    The source is either an XML file, a gzip compressed XML file or a zip
+    archive of XML files. The files are decompressed while being parsed,
+    without being extracted to the disk, up to
+    ``CDS_ILS_IMPORTER_MAX_DECOMPRESSED_SIZE`` bytes each.
+    """
+    max_size = current_app.config["CDS_ILS_IMPORTER_MAX_DECOMPRESSED_SIZE"]
+    lower_path = source_path.lower()
+    if lower_path.endswith(".zip"):
+        with zipfile.ZipFile(source_path) as archive:
+            yield _iter_archive_files(archive, max_size)
+    elif lower_path.endswith(".gz"):
+        with gzip.open(source_path, "rb") as xml_file:
+            yield iter([SizeLimitedFile(
+                xml_file, os.path.basename(source_path), max_size
+            )])
+    else:
+        with open(source_path, "rb") as xml_file:
+            yield iter([xml_file])
+
+
+def get_source_records(source_path):
+    """Generate the records of a source, see `open_source`.
+
+    The records of the files of an archive are numbered continuously, in
+    the order of the archive.
+    """
+    with open_source(source_path) as xml_files:
+        for xml_file in xml_files:
+            yield from get_records_list(xml_file)
+
+
+def count_source_records(source_path):
+    """Count the records of a source, see `open_source`."""
+    return sum(1 for _ in get_source_records(source_path))
+
+
+CHUNK_HEADER = b'<?xml version="1.0" encoding="UTF-8"?>\n<collection>\n'
+
+CHUNK_FOOTER = b"</collection>\n"
+
+
+def _create_chunk_file(directory):
+    """Create an empty chunk file, returning its path."""
+    fd, chunk_path = tempfile.mkstemp(
+        dir=directory, prefix="chunk-", suffix=".xml.gz"
+    )
+    os.close(fd)
+    return chunk_path
+
+
+def split_source_records(source_path, ranges, directory):
+    """Write the records of each range of a source to its own gzip file.
+
+    The source is parsed once, whatever the number of ranges, so that each
+    chunk of records can then be parsed alone. The chunks are compressed
+    (quickly rather than tightly), not to expand compressed sources on the
+    disk. The records keep their namespace declaration.
+
+    :param ranges: sorted ranges of the indexes of the records to write.
+    :param directory: directory of the written files.
+    :returns: the list of the ranges with the path of their file.
+    """
+    chunks = []
+    ranges = iter(ranges)
+    current = next(ranges, None)
+    chunk_file = None
+    try:
+        for index, record in enumerate(get_source_records(source_path)):
+            while current is not None and index >= current[1]:
+                if chunk_file is not None:
+                    chunk_file.write(CHUNK_FOOTER)
+                    chunk_file.close()
+                    chunk_file = None
+                current = next(ranges, None)
+            if current is None:
+                break
+            if index < current[0]:
+                continue
+            if chunk_file is None:
+                chunk_path = _create_chunk_file(directory)
+                chunks.append((current[0], current[1], chunk_path))
+                chunk_file = gzip.open(chunk_path, "wb", compresslevel=1)
+                chunk_file.write(CHUNK_HEADER)
+            chunk_file.write(etree.tostring(record, with_tail=False))
+            chunk_file.write(b"\n")
+        if chunk_file is not None:
+            chunk_file.write(CHUNK_FOOTER)
+            chunk_file.close()
+    except Exception:
+        if chunk_file is not None:
+            chunk_file.close()
+        remove_chunk_files(chunks)
+        raise
+    return chunks
+
+
+def remove_chunk_files(chunks):
+    """Remove the files written by `split_source_records`."""
+    for _, _, chunk_path in chunks:
+        if os.path.exists(chunk_path):
+            os.remove(chunk_path)
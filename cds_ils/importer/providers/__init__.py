@@ -6,3 +6,33 @@
 # the terms of the MIT License; see LICENSE file for more details.
 
 """CDS-ILS Importer providers module."""
+
+from functools import lru_cache
+
+from cds_ils.importer.errors import UnknownProvider
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:
+    from importlib_metadata import entry_points
+
+IMPORTERS_ENTRY_POINT_GROUP = "cds_ils.importers"
+
+
+@lru_cache(maxsize=None)
+def get_importers():
+    """Return the importer classes by provider, loaded once per process."""
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        eps = eps.select(group=IMPORTERS_ENTRY_POINT_GROUP)
+    else:
+        eps = eps.get(IMPORTERS_ENTRY_POINT_GROUP, [])
+    return {entry_point.name: entry_point.load() for entry_point in eps}
+
+
+def get_importer_class(provider):
+    """Return the importer class of the given provider."""
+    try:
+        return get_importers()[provider]
+    except KeyError:
+        raise UnknownProvider(provider=provider)
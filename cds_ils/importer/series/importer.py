@@ -23,6 +23,42 @@ from cds_ils.importer.series.api import search_series_by_isbn, \
     search_series_by_issn
 
 
+class SeriesMatchesCache(object):
+    """Series matching each identifier, shared by the records of a task.
+
+    It spares searching the same series for each record, and lets the
+    records match the series created by the previous ones before they are
+    searchable.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.matches = {}
+
+    def get(self, scheme, value):
+        """Return the pids of the series matching the identifier, if known."""
+        return self.matches.get((scheme, value))
+
+    def set(self, scheme, value, pids):
+        """Store the pids of the series matching the identifier."""
+        self.matches[(scheme, value)] = list(pids)
+
+    def add(self, series):
+        """Make the series match its identifiers."""
+        for identifier in series.get("identifiers", []):
+            pids = self.matches.setdefault(
+                (identifier["scheme"], identifier["value"]), []
+            )
+            if series["pid"] not in pids:
+                pids.append(series["pid"])
+
+    def remove(self, pid):
+        """Forget a series, e.g. when its creation was rolled back."""
+        for pids in self.matches.values():
+            if pid in pids:
+                pids.remove(pid)
+
+
 class SeriesImporter(object):
     """Series importer class."""
 
@@ -30,10 +66,13 @@ class SeriesImporter(object):
         self,
         json_metadata,
         metadata_provider,
+        matches_cache=None,
     ):
         """Constructor."""
         self.json_data = json_metadata
         self.metadata_provider = metadata_provider
+        self.matches_cache = matches_cache
+        self.created = []
 
     def _set_record_import_source(self, record_dict):
         """Set the import source for document."""
@@ -70,12 +109,13 @@ class SeriesImporter(object):
             matched_series, json_series
         )
         try:
-            matched_series.commit()
-            db.session.commit()
+            with db.session.begin_nested():
+                matched_series.commit()
+            if self.matches_cache is not None:
+                self.matches_cache.add(matched_series)
         except IlsValidationError as e:
             click.secho("Field: {}".format(e.errors[0].res["field"]), fg="red")
             click.secho(e.original_exception.message, fg="red")
-            db.session.rollback()
             # raise e TODO handle the incorrect records in the logging
 
     def create_series(self, json_series):
@@ -84,20 +124,21 @@ class SeriesImporter(object):
         series_class = current_app_ils.series_record_cls
 
         record_uuid = uuid.uuid4()
-        provider = SeriesIdProvider.create(
-            object_type="rec",
-            object_uuid=record_uuid,
-        )
-        cleaned_json["pid"] = provider.pid.pid_value
-
         try:
-            series = series_class.create(cleaned_json, record_uuid)
-            db.session.commit()
+            with db.session.begin_nested():
+                provider = SeriesIdProvider.create(
+                    object_type="rec",
+                    object_uuid=record_uuid,
+                )
+                cleaned_json["pid"] = provider.pid.pid_value
+                series = series_class.create(cleaned_json, record_uuid)
+            self.created.append(series)
+            if self.matches_cache is not None:
+                self.matches_cache.add(series)
             return series
         except IlsValidationError as e:
             click.secho("Field: {}".format(e.errors[0].res["field"]), fg="red")
             click.secho(e.original_exception.message, fg="red")
-            db.session.rollback()
             # raise e TODO handle the incorrect records in the logging
 
     def search_for_matching_series(self, json_series):
@@ -118,17 +159,38 @@ class SeriesImporter(object):
         # check by issn first
 
         for issn in issn_list:
-            search = search_series_by_issn(issn)
-            results = search.scan()
-            matches += [x.pid for x in results if x.pid not in matches]
+            pids = self._search_series_pids(
+                "ISSN", issn, search_series_by_issn
+            )
+            matches += [pid for pid in pids if pid not in matches]
 
         for isbn in isbn_list:
-            search = search_series_by_isbn(isbn)
-            results = search.scan()
-            matches += [x.pid for x in results if x.pid not in matches]
+            pids = self._search_series_pids(
+                "ISBN", isbn, search_series_by_isbn
+            )
+            matches += [pid for pid in pids if pid not in matches]
 
         return matches
 
+    def _search_series_pids(self, scheme, value, search_series):
+        """Return the pids of the series matching an identifier."""
+        if self.matches_cache is not None:
+            pids = self.matches_cache.get(scheme, value)
+            if pids is not None:
+                return pids
+
+        pids = [series.pid for series in search_series(value).scan()]
+        if self.matches_cache is not None:
+            self.matches_cache.set(scheme, value, pids)
+        return pids
+
+    def forget_created_series(self):
+        """Remove the created series from the cache, once rolled back."""
+        if self.matches_cache is not None:
+            for series in self.created:
+                self.matches_cache.remove(series["pid"])
+        self.created = []
+
     def import_serial_relation(
         self, series_record, document_record, json_series
     ):
@@ -18,27 +18,37 @@ from invenio_app_ils.permissions import need_permissions
 from webargs import fields
 from webargs.flaskparser import use_kwargs
 
-from cds_ils.importer.api import import_from_xml
+from cds_ils.importer.api import import_from_xml, resume_import
 from cds_ils.importer.models import ImporterAgent, ImporterMode, \
     ImporterTaskEntry, ImporterTaskLog
+from cds_ils.importer.providers import get_importers
 
 
 def create_importer_blueprint(app):
     """Add importer views to the blueprint."""
     blueprint = Blueprint("invenio_app_ils_importer", __name__)
 
-    def allowed_files(filename):
-        """Checks the extension of the files."""
+    def get_allowed_extension(filename):
+        """Returns the allowed extension of the file, if any."""
         allowed_extensions = app.config[
             "CDS_ILS_IMPORTER_FILE_EXTENSIONS_ALLOWED"
         ]
-        return filename.lower().endswith(tuple(allowed_extensions))
+        for extension in allowed_extensions:
+            if filename.lower().endswith(extension):
+                return extension
+
+    def allowed_files(filename):
+        """Checks the extension of the files."""
+        return get_allowed_extension(filename) is not None
 
     def rename_file(filename):
-        """Renames filename with an unique name."""
+        """Renames filename with an unique name.
+
+        The whole allowed extension is kept, e.g. ``.xml.gz``, as the
+        source is decompressed according to it.
+        """
         unique_filename = uuid.uuid4().hex
-        ext = filename.rsplit(".", 1)[1]
-        return unique_filename + "." + ext
+        return unique_filename + get_allowed_extension(filename)
 
     @blueprint.errorhandler(413)
     def payload_too_large(error):
@@ -53,34 +63,51 @@ def create_importer_blueprint(app):
                      methods=["GET"])
     @need_permissions("document-importer")
     def check_next(log_id, next_entry):
+        """Return the state of a task and a page of its entries.
+
+        The entries are paginated in the order they were committed, which
+        differs from their index in the source when the task is imported
+        in parallel or resumed: the following page starts at the returned
+        ``next_entry``.
+        """
         log = ImporterTaskLog.query.filter_by(id=log_id).first()
         if log:
-            children_entries_query = ImporterTaskEntry.query \
-                .filter_by(import_id=log_id)
-            entries = children_entries_query \
-                .filter(ImporterTaskEntry.entry_index >= next_entry) \
-                .order_by(ImporterTaskEntry.entry_index.asc()) \
+            page_size = app.config["CDS_ILS_IMPORTER_CHECK_PAGE_SIZE"]
+            entries = ImporterTaskEntry.query \
+                .filter_by(import_id=log_id) \
+                .filter(ImporterTaskEntry.position >= next_entry) \
+                .order_by(ImporterTaskEntry.position.asc()) \
+                .limit(page_size + 1) \
                 .all()
+            has_more = len(entries) > page_size
+            entries = entries[:page_size]
             obj = {
                 "id": log_id,
                 "state": log.status.value,  # enum value
                 "start_time": arrow.get(log.start_time).isoformat(),
-                "end_time": arrow.get(log.end_time).isoformat() \
-                if log.end_time else None,
+                "end_time": (
+                    arrow.get(log.end_time).isoformat()
+                    if log.end_time else None
+                ),
                 "original_filename": log.original_filename,
                 "provider": log.provider,  # string
                 "mode": log.mode.value,  # enum value
                 "source_type": log.source_type,  # string
+                "next_entry": (
+                    entries[-1].position + 1 if entries else next_entry
+                ),
+                "has_more": has_more,
+                **log.get_counters(),
             }
             if log.entries_count:
                 obj["total_entries"] = log.entries_count
-                obj["loaded_entries"] = children_entries_query.count()
             reports = []
             for entry in entries:
                 if not entry.error:
                     reports.append({
                         "index": entry.entry_index,
                         "success": True,
+                        "unchanged": bool(entry.unchanged),
                         "report": {
                             "ambiguous_documents": entry.ambiguous_documents,
                             "ambiguous_eitems": entry.ambiguous_eitems,
@@ -104,6 +131,28 @@ def create_importer_blueprint(app):
         else:
             return 404
 
+    @blueprint.route("/importer/resume/<int:log_id>", methods=["POST"])
+    @use_kwargs({"force": fields.Bool(missing=False)})
+    @need_permissions("document-importer")
+    def resume(log_id, force):
+        @copy_current_request_context
+        def resume_import_background(log_id, force):
+            """Acts as a proxy to pass the current context to the function."""
+            resume_import(log_id, parallel=True, force=force)
+
+        log = ImporterTaskLog.query.filter_by(id=log_id).first()
+        if not log:
+            abort(404)
+        if not log.is_resumable(force=force):
+            abort(400, "The task cannot be resumed")
+
+        t = Thread(target=resume_import_background, args=(log_id, force))
+        t.start()
+
+        return (json.dumps({"id": log_id}),
+                202,
+                {"ContentType": "application/json"})
+
     @blueprint.route("/importer", methods=["POST"])
     @use_kwargs({"provider": fields.Str(required=True)})
     @use_kwargs({"mode": fields.Str(required=True)})
@@ -113,7 +162,8 @@ def create_importer_blueprint(app):
         def import_from_xml_background(log_id, file, source_type,
                                        provider, mode):
             """Acts as a proxy to pass the current context to the function."""
-            import_from_xml(log_id, file, source_type, provider, mode)
+            import_from_xml(log_id, file, source_type, provider, mode,
+                            parallel=True)
 
         def create_import_task(source_path, original_filename, source_type,
                                provider, mode):
@@ -143,6 +193,9 @@ def create_importer_blueprint(app):
             if not provider:
                 abort(400, "Missing provider")
 
+            if provider not in get_importers():
+                abort(400, "Unknown provider")
+
             if not mode:
                 abort(400, "Missing mode")
 
@@ -11,6 +11,8 @@ import logging
 
 import arrow
 from cds_dojson.marc21.utils import create_record
+from cds_dojson.matcher import matcher
+from cds_dojson.overdo import OverdoBase
 from flask import current_app
 
 from cds_ils.importer import marc21
@@ -80,10 +82,16 @@ class CDSRecordDump(object):
         if self.source_type == "marcxml":
             marc_record = create_record(data["marcxml"])
             try:
-                val = self.dojson_model.do(
+                dojson_model = self.dojson_model
+                if isinstance(dojson_model, OverdoBase):
+                    # match the model once instead of on each call
+                    dojson_model = matcher(
+                        marc_record, dojson_model.entry_point_models
+                    )
+                val = dojson_model.do(
                     marc_record, exception_handlers=exception_handlers
                 )
-                missing = self.dojson_model.missing(marc_record)
+                missing = dojson_model.missing(marc_record)
                 if missing:
                     raise LossyConversion(missing=missing)
                 return dt, val
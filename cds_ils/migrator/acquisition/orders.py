@@ -48,14 +48,14 @@ received           -> "RECEIVED"
 proposal-received  -> "RECEIVED" It was doc request and resolved as acq order
 """
 
-import json
 
 import click
 from invenio_db import db
 
 from cds_ils.migrator.acquisition.vendors import get_vendor_pid_by_legacy_id
-from cds_ils.migrator.api import bulk_index_records, import_record, \
+from cds_ils.migrator.api import BulkIndexedRecords, import_record, \
     model_provider_by_rectype
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.errors import AcqOrderError, ItemMigrationError
 from cds_ils.migrator.items.api import get_item_by_barcode
 from cds_ils.migrator.utils import get_acq_ill_notes, get_cost, get_date, \
@@ -204,8 +204,8 @@ def import_orders_from_json(dump_file, include=None):
     dump_file = dump_file[0]
 
     click.echo("Importing acquisition orders ..")
-    with click.progressbar(json.load(dump_file)) as input_data:
-        ils_records = []
+    with dump_progressbar(dump_file) as input_data, \
+            BulkIndexedRecords() as ils_records:
         for record in input_data:
             model, provider = model_provider_by_rectype("acq-order")
             ils_record = import_record(
@@ -217,4 +217,3 @@ def import_orders_from_json(dump_file, include=None):
 
             ils_records.append(ils_record)
         db.session.commit()
-    bulk_index_records(ils_records)
@@ -18,14 +18,14 @@ legacy_id:
     notes:
 """
 
-import json
 
 import click
 from invenio_app_ils.acquisition.proxies import current_ils_acq
 from invenio_db import db
 
-from cds_ils.migrator.api import bulk_index_records, import_record, \
+from cds_ils.migrator.api import BulkIndexedRecords, import_record, \
     model_provider_by_rectype
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.errors import VendorError
 
 
@@ -52,8 +52,8 @@ def import_vendors_from_json(dump_file):
     model, provider = model_provider_by_rectype("vendor")
 
     click.echo("Importing vendors ..")
-    with click.progressbar(json.load(dump_file)) as input_data:
-        ils_records = []
+    with dump_progressbar(dump_file) as input_data, \
+            BulkIndexedRecords() as ils_records:
         for record in input_data:
             ils_record = import_record(
                 record,
@@ -63,4 +63,3 @@ def import_vendors_from_json(dump_file):
             )
             ils_records.append(ils_record)
         db.session.commit()
-    bulk_index_records(ils_records)
@@ -8,9 +8,11 @@
 
 """CDS-ILS migrator API."""
 
-import json
 import logging
+import multiprocessing
+from collections import deque
 from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
 
 import click
 from celery import shared_task
@@ -29,13 +31,14 @@ from invenio_app_ils.items.api import ItemIdProvider
 from invenio_app_ils.proxies import current_app_ils
 from invenio_app_ils.relations.api import MULTIPART_MONOGRAPH_RELATION
 from invenio_app_ils.series.api import SeriesIdProvider
-from invenio_base.app import create_cli
 from invenio_circulation.proxies import current_circulation
 from invenio_db import db
 from invenio_indexer.api import RecordIndexer
 
 from cds_ils.importer.errors import ManualImportRequired
 from cds_ils.migrator.DocumentLoader import CDSDocumentDumpLoader
+from cds_ils.migrator.dump_reader import dump_progressbar
+from cds_ils.migrator.indexer import BulkReindexer
 from cds_ils.migrator.RecordLoader import CDSRecordDumpLoader
 from cds_ils.migrator.relations.api import create_parent_child_relation
 from cds_ils.migrator.series.api import clean_document_json_for_multipart, \
@@ -50,30 +53,134 @@ records_logger = logging.getLogger("records_errored")
 def import_documents_from_record_file(sources, include):
     """Import documents from records file generated by CDS-Migrator-Kit."""
     include = include if include is None else include.split(",")
-    records = []
-    for idx, source in enumerate(sources, 1):
-        click.echo(
-            "({}/{}) Migrating documents in {}...".format(
-                idx, len(sources), source.name
+    # index the new parent records of all the sources
+    with BulkIndexedRecords() as records:
+        for idx, source in enumerate(sources, 1):
+            click.echo(
+                "({}/{}) Migrating documents in {}...".format(
+                    idx, len(sources), source.name
+                )
             )
-        )
-        model, provider = model_provider_by_rectype("document")
-        include_keys = None if include is None else include.split(",")
-        with click.progressbar(json.load(source).items()) as bar:
-            records = []
-            for key, parent in bar:
-                click.echo(
-                    'Importing document "{}"...'.format(parent["legacy_recid"])
+            model, provider = model_provider_by_rectype("document")
+            include_keys = None if include is None else include.split(",")
+            with dump_progressbar(source, items=True) as bar:
+                for key, parent in bar:
+                    click.echo(
+                        'Importing document "{}"...'.format(
+                            parent["legacy_recid"]
+                        )
+                    )
+                    if include_keys is None or key in include_keys:
+                        record = import_record(parent, model, provider)
+                        records.append(record)
+
+
+def _import_document_item(item, source_type, eager, include):
+    """Import a document of a dump, logging the outcome."""
+    click.echo('Processing document "{}"...'.format(item["recid"]))
+    if include is None or str(item["recid"]) in include:
+        try:
+            import_document_from_dump(item, source_type, eager=eager)
+
+            migrated_logger.warning("#RECID {0}: OK".format(item["recid"]))
+        except IlsValidationError as e:
+            records_logger.error(
+                "@RECID: {0} FATAL: {1}".format(
+                    item["recid"],
+                    str(e.original_exception.message),
                 )
-                if include_keys is None or key in include_keys:
-                    record = import_record(parent, model, provider)
-                    records.append(record)
-    # Index all new parent records
-    bulk_index_records(records)
+            )
+        except Exception as e:
+            records_logger.error(
+                "@RECID: {0} ERROR: {1}".format(item["recid"], str(e))
+            )
+
+
+class _RecordsLogsListener(QueueListener):
+    """Log the records logs of the worker processes in the parent."""
+
+    def handle(self, record):
+        """Handle the record with the handlers of its logger."""
+        record = self.prepare(record)
+        logging.getLogger(record.name).handle(record)
+
+
+# application and logs queue of the parent process, inherited by the
+# forked workers
+_migration_app = None
+_migration_logs_queue = None
+
+
+def _init_migration_worker():
+    """Send the records logs of a worker process to the parent process."""
+    for logger in (migrated_logger, records_logger):
+        logger.handlers = [QueueHandler(_migration_logs_queue)]
+        logger.propagate = False
+
+
+def _import_document_item_in_worker(item, source_type, include):
+    """Import a document of a dump in a worker process.
+
+    Each worker has its own application context and database session.
+    """
+    with _migration_app.app_context():
+        _import_document_item(item, source_type, True, include)
+
 
+def _import_documents_in_workers(source, source_type, include, workers):
+    """Import the documents of a dump in worker processes.
 
-def import_documents_from_dump(sources, source_type, eager, include):
-    """Load records."""
+    The dump is read once by the parent process, which sends its documents
+    to the workers. At most twice as many documents as workers are waiting
+    to be imported, so that the dump is not read faster than imported.
+    Return the number of documents processed.
+    """
+    global _migration_app, _migration_logs_queue
+
+    # the workers inherit the application and the queue by forking
+    context = multiprocessing.get_context("fork")
+    _migration_app = current_app._get_current_object()
+    _migration_logs_queue = context.Queue()
+    # the workers must open their own database connections
+    db.engine.dispose()
+
+    pool = context.Pool(workers, initializer=_init_migration_worker)
+    # started once the workers are forked, not to fork its running thread
+    listener = _RecordsLogsListener(_migration_logs_queue)
+    listener.start()
+    count = 0
+    try:
+        with dump_progressbar(source) as items:
+            pending = deque()
+            for item in items:
+                pending.append(pool.apply_async(
+                    _import_document_item_in_worker,
+                    (item, source_type, include),
+                ))
+                if len(pending) >= 2 * workers:
+                    pending.popleft().get()
+                    count += 1
+            while pending:
+                pending.popleft().get()
+                count += 1
+        # let the workers send their last logs before exiting
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        listener.stop()
+    return count
+
+
+def import_documents_from_dump(sources, source_type, eager, include,
+                               workers=1):
+    """Load records.
+
+    :param workers: number of processes importing the documents of each
+        dump, when importing eagerly.
+    """
     include = include if include is None else include.split(",")
     for idx, source in enumerate(sources, 1):
         click.echo(
@@ -81,32 +188,16 @@ def import_documents_from_dump(sources, source_type, eager, include):
                 idx, len(sources), source.name
             )
         )
-        data = json.load(source)
-        with click.progressbar(data) as records:
-            for item in records:
-                click.echo('Processing document "{}"...'.format(item["recid"]))
-                if include is None or str(item["recid"]) in include:
-                    try:
-                        import_document_from_dump(
-                            item, source_type, eager=eager
-                        )
+        if eager and workers > 1:
+            count = _import_documents_in_workers(
+                source, source_type, include, workers
+            )
+            click.echo("{0} documents processed".format(count))
+            continue
 
-                        migrated_logger.warning(
-                            "#RECID {0}: OK".format(item["recid"])
-                        )
-                    except IlsValidationError as e:
-                        records_logger.error(
-                            "@RECID: {0} FATAL: {1}".format(
-                                item["recid"],
-                                str(e.original_exception.message),
-                            )
-                        )
-                    except Exception as e:
-                        records_logger.error(
-                            "@RECID: {0} ERROR: {1}".format(
-                                item["recid"], str(e)
-                            )
-                        )
+        with dump_progressbar(source) as records:
+            for item in records:
+                _import_document_item(item, source_type, eager, include)
 
 
 @contextmanager
@@ -124,15 +215,8 @@ def commit():
 def reindex_pidtype(pid_type):
     """Reindex records with the specified pid_type."""
     click.echo('Indexing pid type "{}"...'.format(pid_type))
-    cli = create_cli()
-    runner = current_app.test_cli_runner()
-    runner.invoke(
-        cli,
-        "index reindex --pid-type {} --yes-i-know".format(pid_type),
-        catch_exceptions=True,
-    )
-    runner.invoke(cli, "index run", catch_exceptions=True)
-    click.echo("Indexing completed!")
+    errors = BulkReindexer().reindex(pid_type)
+    click.echo("Indexing completed with {} errors!".format(errors))
 
 
 def bulk_index_records(records):
@@ -145,6 +229,41 @@ def bulk_index_records(records):
     click.echo("Indexing completed!")
 
 
+class BulkIndexedRecords(object):
+    """Collect the migrated records and bulk index them by batches.
+
+    The records are indexed every ``CDS_ILS_MIGRATOR_BULK_INDEX_SIZE``
+    records, and the remaining ones when leaving the context, so that the
+    records of a dump are not all kept in memory until the end.
+    """
+
+    def __init__(self, size=None):
+        """Constructor."""
+        self.size = size or \
+            current_app.config["CDS_ILS_MIGRATOR_BULK_INDEX_SIZE"]
+        self.records = []
+
+    def __enter__(self):
+        """Start collecting the records."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Index the remaining records, already committed."""
+        self.flush()
+
+    def append(self, record):
+        """Add a migrated record, indexing the batch once full."""
+        self.records.append(record)
+        if len(self.records) >= self.size:
+            self.flush()
+
+    def flush(self):
+        """Bulk index the collected records."""
+        if self.records:
+            bulk_index_records(self.records)
+            self.records = []
+
+
 def model_provider_by_rectype(rectype):
     """Return the correct model and PID provider based on the rectype."""
     if rectype in ("serial", "multipart"):
@@ -277,7 +396,7 @@ def import_multipart(json_record):
 
 def import_multipart_from_file(dump_file, rectype):
     """Load parent records from file."""
-    with click.progressbar(json.load(dump_file).items()) as bar:
+    with dump_progressbar(dump_file, items=True) as bar:
         for key, legacy_record in bar:
             click.echo(
                 'Importing parent "{0}({1})"...'.format(
@@ -310,8 +429,9 @@ def import_multipart_from_file(dump_file, rectype):
 def import_serial_from_file(dump_file, rectype):
     """Load serial records from file."""
     model, provider = model_provider_by_rectype(rectype)
-    with click.progressbar(json.load(dump_file).items()) as bar:
-        records = []
+    # index the new serial records
+    with dump_progressbar(dump_file, items=True) as bar, \
+            BulkIndexedRecords() as records:
         for key, json_record in bar:
             if "legacy_recid" in json_record:
                 click.echo(
@@ -331,8 +451,6 @@ def import_serial_from_file(dump_file, rectype):
                 if has_children:
                     record = import_record(json_record, model, provider)
                     records.append(record)
-    # Index all new serial records
-    bulk_index_records(records)
 
 
 def import_record(dump, model, pid_provider, legacy_id_key="legacy_recid"):
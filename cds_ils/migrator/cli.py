@@ -67,8 +67,15 @@ def migration():
     "--skip-indexing",
     is_flag=True,
 )
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes migrating the documents of a dump.",
+)
 @with_appcontext
-def documents(sources, source_type, include, skip_indexing):
+def documents(sources, source_type, include, skip_indexing, workers):
     """Migrate documents from CDS legacy."""
     if source_type == "migrator-kit":
         import_documents_from_record_file(sources, include)
@@ -78,6 +85,7 @@ def documents(sources, source_type, include, skip_indexing):
             source_type=source_type,
             eager=True,
             include=include,
+            workers=workers,
         )
     # We don't get the record back from _loadrecord so re-index all documents
     if not skip_indexing:
@@ -248,10 +256,22 @@ def validate_multipart():
 
 
 @migration.command()
+@click.option(
+    "--concurrency",
+    "-c",
+    type=click.IntRange(min=1),
+    help="Number of documents whose files are migrated concurrently.",
+)
+@click.option(
+    "--rate",
+    "-r",
+    type=click.FloatRange(min=0.01),
+    help="Number of file downloads started per second.",
+)
 @with_appcontext
-def eitems_files():
+def eitems_files(concurrency, rate):
     """Create eitems for migrated documents."""
-    process_files_from_legacy()
+    process_files_from_legacy(concurrency=concurrency, rate=rate)
 
 
 @migration.command()
@@ -8,13 +8,13 @@
 
 """CDS-ILS document requests migrator API."""
 
-import json
 
 import click
 from invenio_db import db
 
-from cds_ils.migrator.api import bulk_index_records, import_record, \
+from cds_ils.migrator.api import BulkIndexedRecords, import_record, \
     model_provider_by_rectype
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.utils import get_acq_ill_notes, get_patron_pid
 
 
@@ -47,8 +47,8 @@ def import_document_requests_from_json(dump_file):
     dump_file = dump_file[0]
 
     click.echo("Importing document requests ..")
-    with click.progressbar(json.load(dump_file)) as input_data:
-        ils_records = []
+    with dump_progressbar(dump_file) as input_data, \
+            BulkIndexedRecords() as ils_records:
         for record in input_data:
             model, provider = model_provider_by_rectype("document-request")
             ils_record = import_record(
@@ -59,4 +59,3 @@ def import_document_requests_from_json(dump_file):
             )
             ils_records.append(ils_record)
         db.session.commit()
-    bulk_index_records(ils_records)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# CDS-ILS is free software; you can redistribute it and/or modify it under
+# the terms of the MIT License; see LICENSE file for more details.
+
+"""CDS-ILS migrator streaming reader of JSON dumps."""
+
+import json
+import os
+import re
+from contextlib import contextmanager
+
+import click
+
+WHITESPACE = re.compile(r"\s*")
+
+NUMBER_DELIMITERS = frozenset(",]}: \t\n\r")
+
+
+class JSONDumpReader(object):
+    """Read the values of a JSON dump one by one.
+
+    The dump is either an array, or an object whose items are read one by
+    one. The file is read by chunks and each value is decoded as soon as it
+    is complete, so that the memory used does not depend on the size of
+    the dump.
+    """
+
+    def __init__(self, dump_file, chunk_size=1024 * 1024):
+        """Constructor."""
+        self.dump_file = dump_file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.index = 0
+        self.read_count = 0
+        self.eof = False
+
+    def _read(self, size):
+        """Append the next chunk of the file to the unread buffer."""
+        chunk = self.dump_file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.read_count += len(chunk)
+        self.buffer = self.buffer[self.index:] + chunk
+        self.index = 0
+        return True
+
+    def _peek(self):
+        """Return the next character which is not a whitespace, if any."""
+        while True:
+            self.index = WHITESPACE.match(self.buffer, self.index).end()
+            if self.index < len(self.buffer):
+                return self.buffer[self.index]
+            if not self._read(self.chunk_size):
+                return ""
+
+    def _expect(self, *chars):
+        """Consume the next character, which must be one of the given."""
+        char = self._peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(
+                "Expecting one of '{0}'".format("".join(chars)),
+                self.buffer,
+                self.index,
+            )
+        self.index += 1
+        return char
+
+    def _is_complete(self, value, end):
+        """Check if a decoded value cannot continue in the next chunk."""
+        if end >= len(self.buffer):
+            return False
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            # the digits or the exponent of a number could be cut
+            return self.buffer[end] in NUMBER_DELIMITERS
+        return True
+
+    def _decode(self):
+        """Decode the next value, reading the file until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.index)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                if self.eof or self._is_complete(value, end):
+                    self.index = end
+                    return value
+            # read at least as much as pending, not to decode a large
+            # value again for each chunk
+            self._read(max(self.chunk_size, len(self.buffer) - self.index))
+
+    def iter_array(self):
+        """Generate the values of a dump made of an array."""
+        self._expect("[")
+        if self._peek() == "]":
+            self.index += 1
+            return
+        while True:
+            yield self._decode()
+            if self._expect(",", "]") == "]":
+                return
+
+    def iter_items(self):
+        """Generate the key and value pairs of a dump made of an object."""
+        self._expect("{")
+        if self._peek() == "}":
+            self.index += 1
+            return
+        while True:
+            key = self._decode()
+            self._expect(":")
+            yield key, self._decode()
+            if self._expect(",", "}") == "}":
+                return
+
+    def size(self):
+        """Return the size of the dump file in bytes, if known."""
+        try:
+            return os.fstat(self.dump_file.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def tell(self):
+        """Return the position in the dump file, in bytes if possible."""
+        try:
+            return self.dump_file.buffer.tell()
+        except (AttributeError, OSError, ValueError):
+            return self.read_count
+
+
+def _track_progress(records, reader, bar):
+    """Update the progress bar with the position in the dump."""
+    position = 0
+    for record in records:
+        offset = reader.tell()
+        bar.update(offset - position)
+        position = offset
+        yield record
+
+
+@contextmanager
+def dump_progressbar(dump_file, items=False):
+    """Stream the records of a JSON dump, with a progress bar.
+
+    The progress is reported from the position in the dump, since the
+    number of records is unknown until the whole dump is read.
+
+    :param items: the dump is an object, generate its key and value pairs
+        instead of the values of an array.
+    """
+    reader = JSONDumpReader(dump_file)
+    records = reader.iter_items() if items else reader.iter_array()
+    size = reader.size()
+    if size is None:
+        with click.progressbar(records) as bar:
+            yield bar
+        return
+
+    with click.progressbar(length=size) as bar:
+        yield _track_progress(records, reader, bar)
@@ -7,14 +7,10 @@
 # under the terms of the MIT License; see LICENSE file for more details.
 
 """CDS-ILS migrator API."""
-import hashlib
-import io
 import logging
-import time
 import uuid
 
 import click
-import requests
 from invenio_app_ils.documents.indexer import DocumentIndexer
 from invenio_app_ils.eitems.api import EItem, EItemIdProvider
 from invenio_app_ils.eitems.indexer import EItemIndexer
@@ -25,45 +21,58 @@ from invenio_files_rest.models import Bucket, ObjectVersion
 from cds_ils.migrator.documents.api import get_all_documents_with_files, \
     get_documents_with_ebl_eitems, get_documents_with_external_eitems, \
     get_documents_with_proxy_eitems
+from cds_ils.migrator.eitems.downloader import LegacyFilesDownloader
 from cds_ils.migrator.errors import EItemMigrationError, FileMigrationError
 
 migrated_logger = logging.getLogger("migrated_records")
 records_logger = logging.getLogger("records_errored")
 
 
-def import_legacy_files(file_link):
-    """Download file from legacy."""
-    # needed to ignore the migrator in the legacy statistics
-    download_request_headers = {"User-Agent": "CDS-ILS Migrator"}
-
-    file_response = requests.get(
-        file_link, stream=True, headers=download_request_headers
-    )
-
-    file_content_stream = io.BytesIO(file_response.content)
-
-    return file_content_stream
+def delete_file_storage(file_record):
+    """Delete the stored content of a file whose creation is rolled back."""
+    file_record.file.storage().delete()
 
 
 def create_file(bucket, file_stream, filename, dump_file_checksum):
-    """Create file for given bucket."""
-    file_record = ObjectVersion.create(bucket, filename, stream=file_stream)
-    assert file_record.file.checksum == "md5:{}".format(dump_file_checksum)
+    """Create file for given bucket, verifying its checksum.
 
-    db.session.add(file_record)
-    db.session.commit()
+    The checksum computed by the storage while saving the file is compared
+    to the one of the dump.
+    """
+    file_record = ObjectVersion.create(bucket, filename, stream=file_stream)
+    try:
+        checksum = "md5:{}".format(dump_file_checksum)
+        if file_record.file.checksum != checksum:
+            raise FileMigrationError(
+                "checksum mismatch, expected {0} got {1}".format(
+                    checksum, file_record.file.checksum
+                )
+            )
+    except Exception:
+        # the transaction is rolled back, but not the file storage
+        delete_file_storage(file_record)
+        raise
     return file_record
 
 
-def create_eitem_with_bucket_for_document(document_pid):
-    """Create EItem and its file bucket."""
-    eitem = create_eitem(document_pid, open_access=True)
-    with db.session.begin_nested():
-        bucket = Bucket.create()
-        eitem["bucket_id"] = str(bucket.id)
-        eitem.commit()
-    db.session.commit()
-    return eitem, bucket
+def get_stored_files_checksums(document_pid):
+    """Return the checksums of the files already stored for a document."""
+    search = current_app_ils.eitem_search_cls().search_by_document_pid(
+        document_pid
+    )
+    bucket_ids = [
+        hit.bucket_id
+        for hit in search.source(["bucket_id"]).scan()
+        if getattr(hit, "bucket_id", None)
+    ]
+    if not bucket_ids:
+        return set()
+    objects = ObjectVersion.query.filter(
+        ObjectVersion.bucket_id.in_(bucket_ids),
+        ObjectVersion.is_head.is_(True),
+        ObjectVersion.file_id.isnot(None),
+    )
+    return {obj.file.checksum for obj in objects}
 
 
 def create_eitem(document_pid, open_access=True):
@@ -84,7 +93,7 @@ def create_eitem(document_pid, open_access=True):
     return eitem
 
 
-def process_files_from_legacy():
+def process_files_from_legacy(concurrency=None, rate=None):
     r"""Process legacy file.
 
     File dump object
@@ -125,65 +134,97 @@ def process_files_from_legacy():
     }
     """
     search = get_all_documents_with_files()
+    # the scroll would expire while the files are downloaded
+    documents_pids = [hit.pid for hit in search.source(["pid"]).scan()]
+
+    click.echo("Found {} documents with files.".format(len(documents_pids)))
+    downloader = LegacyFilesDownloader(concurrency=concurrency, rate=rate)
+    results = downloader.run(migrate_document_files, documents_pids)
+    failed = len([migrated for migrated in results if not migrated])
+    click.secho(
+        "Migrated the files of {0} documents, {1} failed.".format(
+            len(documents_pids) - failed, failed
+        ),
+        fg="red" if failed else "green",
+    )
 
-    click.echo("Found {} documents with files.".format(search.count()))
-    for hit in search.scan():
-        # try not to kill legacy server
-        time.sleep(3)
-        # make sure the document is in DB not only ES
-        Document = current_app_ils.document_record_cls
-        document = Document.get_record_by_pid(hit.pid)
-        click.echo("Processing document {}...".format(document["pid"]))
 
-        try:
-            for file_dump in document["_migration"]["files"]:
-
-                # check if url migrated from MARC
-                url_in_marc = [
-                    item
-                    for item in document["_migration"]["eitems_file_links"]
-                    if item["value"] == file_dump["url"]
-                ]
-                if not url_in_marc:
-                    msg = (
-                        "DOCUMENT: {pid}: ERROR: File {file}"
-                        " found in the dump but not in MARC".format(
-                            pid=document.pid, file=file_dump["url"]
-                        )
-                    )
-                    raise FileMigrationError(msg)
+def migrate_file(document, file_dump, downloader):
+    """Download a legacy file and create its eitem."""
+    # get filename
+    file_name = file_dump["description"]
+    if not file_name:
+        file_name = file_dump["full_name"]
 
-                click.echo("File: {}".format(file_dump["url"]))
-                eitem, bucket = create_eitem_with_bucket_for_document(
-                    document["pid"]
-                )
+    bucket = Bucket.create()
+    with downloader.open(file_dump["url"]) as file_stream:
+        file_record = create_file(
+            bucket, file_stream, file_name, file_dump["checksum"]
+        )
 
-                # get filename
-                file_name = file_dump["description"]
-                if not file_name:
-                    file_name = file_dump["full_name"]
+    try:
+        eitem = create_eitem(document["pid"], open_access=True)
+        eitem["bucket_id"] = str(bucket.id)
+        eitem.commit()
+        db.session.commit()
+    except Exception:
+        # the transaction is rolled back, but not the file storage
+        delete_file_storage(file_record)
+        raise
+    click.echo("Indexing...")
+    EItemIndexer().index(eitem)
 
-                file_stream = import_legacy_files(file_dump["url"])
 
-                file = create_file(
-                    bucket, file_stream, file_name, file_dump["checksum"]
-                )
-                click.echo("Indexing...")
-                EItemIndexer().index(eitem)
-        except Exception as e:
-            msg = "DOCUMENT: {pid} CAN'T MIGRATE FILES ERROR: {error}".format(
-                pid=document["pid"], error=str(e)
-            )
-            click.secho(msg)
-            records_logger.error(msg)
-            continue
+def migrate_document_files(document_pid, downloader):
+    """Migrate the legacy files of a document, skipping the stored ones."""
+    Document = current_app_ils.document_record_cls
+    click.echo("Processing document {}...".format(document_pid))
 
-        # make sure the files are not imported twice by setting the flag
-        document["_migration"]["eitems_has_files"] = False
-        document["_migration"]["has_files"] = False
-        document.commit()
-        db.session.commit()
-        DocumentIndexer().index(document)
+    try:
+        # make sure the document is in DB not only ES
+        document = Document.get_record_by_pid(document_pid)
+        stored_checksums = get_stored_files_checksums(document["pid"])
+        for file_dump in document["_migration"]["files"]:
+
+            # check if url migrated from MARC
+            url_in_marc = [
+                item
+                for item in document["_migration"]["eitems_file_links"]
+                if item["value"] == file_dump["url"]
+            ]
+            if not url_in_marc:
+                msg = (
+                    "DOCUMENT: {pid}: ERROR: File {file}"
+                    " found in the dump but not in MARC".format(
+                        pid=document.pid, file=file_dump["url"]
+                    )
+                )
+                raise FileMigrationError(msg)
+
+            checksum = "md5:{}".format(file_dump["checksum"])
+            if checksum in stored_checksums:
+                click.echo("File: {} already stored".format(file_dump["url"]))
+                continue
+
+            click.echo("File: {}".format(file_dump["url"]))
+            migrate_file(document, file_dump, downloader)
+            stored_checksums.add(checksum)
+    except Exception as e:
+        db.session.rollback()
+        msg = "DOCUMENT: {pid} CAN'T MIGRATE FILES ERROR: {error}".format(
+            pid=document_pid, error=str(e)
+        )
+        click.secho(msg)
+        records_logger.error(msg)
+        return False
+
+    # make sure the files are not imported twice by setting the flag
+    document["_migration"]["eitems_has_files"] = False
+    document["_migration"]["has_files"] = False
+    document.commit()
+    db.session.commit()
+    DocumentIndexer().index(document)
+    return True
 
 
 def migrate_external_links():
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# CDS-ILS is free software; you can redistribute it and/or modify it under
+# the terms of the MIT License; see LICENSE file for more details.
+
+"""CDS-ILS migrator downloader of the legacy files."""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket(object):
+    """Limit the rate of an action shared by several threads.
+
+    Tokens are added at a constant rate, up to the capacity of the bucket,
+    and each action takes one, waiting for it when the bucket is empty.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """Constructor.
+
+        :param rate: number of tokens added per second.
+        :param capacity: maximum number of tokens, taken without waiting.
+        """
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """Add the tokens accumulated since the last update."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class LegacyFilesDownloader(object):
+    """Download the files of the legacy documents concurrently.
+
+    The documents are processed by a pool of threads sharing a pool of
+    HTTP connections, and the downloads are started at most at the
+    configured rate not to overload the legacy server.
+    """
+
+    # needed to ignore the migrator in the legacy statistics
+    HEADERS = {"User-Agent": "CDS-ILS Migrator"}
+
+    def __init__(self, concurrency=None, rate=None, timeout=None):
+        """Constructor.
+
+        :param concurrency: number of documents processed concurrently.
+        :param rate: number of downloads started per second.
+        :param timeout: seconds waited for the legacy server to respond.
+        """
+        config = current_app.config
+        self.concurrency = concurrency or \
+            config["CDS_ILS_MIGRATOR_FILES_CONCURRENCY"]
+        self.timeout = timeout or config["CDS_ILS_MIGRATOR_FILES_TIMEOUT"]
+        self.rate_limit = TokenBucket(
+            rate or config["CDS_ILS_MIGRATOR_FILES_RATE"],
+            capacity=self.concurrency,
+        )
+        self.session = requests.Session()
+        self.session.headers.update(self.HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=self.concurrency, pool_maxsize=self.concurrency
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @contextmanager
+    def open(self, url):
+        """Stream the content of a file."""
+        self.rate_limit.acquire()
+        response = self.session.get(url, stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            # content encoded for the transfer only is stored decoded
+            response.raw.decode_content = True
+            yield response.raw
+        finally:
+            response.close()
+
+    def run(self, process, values):
+        """Call a function on each value in the pool of threads.
+
+        The values are consumed at most twice as fast as they are
+        processed, and the results are generated in the same order.
+        """
+        app = current_app._get_current_object()
+
+        def process_in_context(value):
+            with app.app_context():
+                return process(value, self)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = deque()
+            for value in values:
+                pending.append(executor.submit(process_in_context, value))
+                if len(pending) >= 2 * self.concurrency:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
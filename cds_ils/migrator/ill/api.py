@@ -50,7 +50,6 @@ received      -> REQUESTED - until library advices otherwise
 requested     -> REQUESTED - migrated - 8 results
 """
 
-import json
 
 import click
 from elasticsearch_dsl import Q
@@ -58,8 +57,9 @@ from invenio_app_ils.ill.api import Library
 from invenio_app_ils.ill.proxies import current_ils_ill
 from invenio_db import db
 
-from cds_ils.migrator.api import bulk_index_records, import_record, \
+from cds_ils.migrator.api import BulkIndexedRecords, import_record, \
     model_provider_by_rectype
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.errors import BorrowingRequestError, ItemMigrationError
 from cds_ils.migrator.items.api import get_item_by_barcode
 from cds_ils.migrator.utils import get_acq_ill_notes, get_cost, get_date, \
@@ -179,8 +179,8 @@ def import_ill_borrowing_requests_from_json(dump_file):
     model, provider = model_provider_by_rectype("borrowing-request")
 
     click.echo("Importing borrowing requests ..")
-    with click.progressbar(json.load(dump_file)) as input_data:
-        ils_records = []
+    with dump_progressbar(dump_file) as input_data, \
+            BulkIndexedRecords() as ils_records:
         for record in input_data:
             ils_record = import_record(
                 migrate_to_ils(record),
@@ -190,4 +190,3 @@ def import_ill_borrowing_requests_from_json(dump_file):
             )
             ils_records.append(ils_record)
         db.session.commit()
-    bulk_index_records(ils_records)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# CDS-ILS is free software; you can redistribute it and/or modify it under
+# the terms of the MIT License; see LICENSE file for more details.
+
+"""CDS-ILS migrator bulk reindexer."""
+
+import logging
+import multiprocessing
+from collections import deque
+from itertools import islice
+
+import click
+from elasticsearch.helpers import parallel_bulk
+from flask import current_app
+from invenio_db import db
+from invenio_indexer.api import RecordIndexer
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_search import current_search_client
+
+records_logger = logging.getLogger("records_errored")
+
+# application of the parent process, inherited by the forked workers
+_reindex_app = None
+
+
+def iter_record_uuids(pid_type, batch_size=1000):
+    """Stream the uuids of the registered records of a pid type."""
+    query = db.session.query(PersistentIdentifier.object_uuid).filter(
+        PersistentIdentifier.pid_type == pid_type,
+        PersistentIdentifier.object_type == "rec",
+        PersistentIdentifier.status == PIDStatus.REGISTERED,
+    )
+    for object_uuid, in query.yield_per(batch_size):
+        yield str(object_uuid)
+
+
+def count_records(pid_type):
+    """Count the registered records of a pid type."""
+    return PersistentIdentifier.query.filter_by(
+        pid_type=pid_type,
+        object_type="rec",
+        status=PIDStatus.REGISTERED,
+    ).count()
+
+
+def _serialize_records(record_uuids):
+    """Build the index actions of the records, with the failed records."""
+    indexer = RecordIndexer()
+    actions = []
+    errors = []
+    for record_uuid in record_uuids:
+        try:
+            actions.append(indexer._index_action(dict(id=record_uuid)))
+        except Exception as e:
+            errors.append((record_uuid, str(e)))
+    return actions, errors
+
+
+def _serialize_records_in_worker(record_uuids):
+    """Build the index actions of the records in a worker process."""
+    with _reindex_app.app_context():
+        try:
+            return _serialize_records(record_uuids)
+        finally:
+            db.session.remove()
+
+
+def _chunks(iterable, size):
+    """Split an iterable in lists of the given size."""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+class IndicesRefresh(object):
+    """Disable the refresh of the written indices, then restore it."""
+
+    def __init__(self, client):
+        """Constructor."""
+        self.client = client
+        self.indices = set()
+        self.intervals = {}
+
+    def disable(self, index):
+        """Disable the refresh of an index, keeping its interval.
+
+        :param index: name or alias of the index.
+        """
+        if index in self.indices:
+            return
+        self.indices.add(index)
+        settings = self.client.indices.get_settings(
+            index=index, name="index.refresh_interval"
+        )
+        for name, index_settings in settings.items():
+            if name in self.intervals:
+                continue
+            self.intervals[name] = index_settings.get("settings", {}) \
+                .get("index", {}).get("refresh_interval")
+            self.client.indices.put_settings(
+                index=name, body={"index": {"refresh_interval": "-1"}}
+            )
+
+    def restore(self):
+        """Restore the refresh interval of the indices and refresh them."""
+        for name, interval in self.intervals.items():
+            # an unset interval restores the default one
+            self.client.indices.put_settings(
+                index=name, body={"index": {"refresh_interval": interval}}
+            )
+            self.client.indices.refresh(index=name)
+        self.indices = set()
+        self.intervals = {}
+
+
+class BulkReindexer(object):
+    """Reindex all the records of a pid type with parallel bulk requests.
+
+    The uuids of the records are streamed from the database and their
+    index actions are built by a pool of processes, at most
+    ``queue_size`` chunks ahead of the bulk requests. The refresh of the
+    written indices is disabled until all the records are sent.
+    """
+
+    def __init__(self, chunk_size=None, thread_count=None, workers=None,
+                 queue_size=None):
+        """Constructor.
+
+        :param chunk_size: number of records of each bulk request.
+        :param thread_count: number of concurrent bulk requests.
+        :param workers: number of processes building the index actions,
+            built by the current process if zero.
+        :param queue_size: number of chunks built ahead by the workers.
+        """
+        config = current_app.config
+        self.chunk_size = chunk_size or \
+            config["CDS_ILS_MIGRATOR_REINDEX_CHUNK_SIZE"]
+        self.thread_count = thread_count or \
+            config["CDS_ILS_MIGRATOR_REINDEX_THREAD_COUNT"]
+        self.workers = config["CDS_ILS_MIGRATOR_REINDEX_WORKERS"] \
+            if workers is None else workers
+        self.queue_size = queue_size or 2 * max(self.workers, 1)
+        # the bulk requests are sent from other threads, without context
+        self.app = current_app._get_current_object()
+        self.client = current_search_client._get_current_object()
+        self.refresh = IndicesRefresh(self.client)
+        self.errors = 0
+
+    def _log_errors(self, errors):
+        """Log the records which could not be indexed."""
+        for record_uuid, error in errors:
+            self.errors += 1
+            records_logger.error(
+                "@UUID: {0} INDEXING ERROR: {1}".format(record_uuid, error)
+            )
+
+    def _serialized_chunks(self, pid_type, pool):
+        """Generate the index actions and errors of each chunk of records."""
+        chunks = _chunks(iter_record_uuids(pid_type), self.chunk_size)
+        if pool is None:
+            for chunk in chunks:
+                yield _serialize_records(chunk)
+            return
+
+        pending = deque()
+        for chunk in chunks:
+            pending.append(
+                pool.apply_async(_serialize_records_in_worker, (chunk,))
+            )
+            if len(pending) >= self.queue_size:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def _actions(self, pid_type, pool):
+        """Generate the index actions, disabling the refresh of indices."""
+        # iterated by the threads sending the bulk requests
+        with self.app.app_context():
+            for actions, errors in self._serialized_chunks(pid_type, pool):
+                self._log_errors(errors)
+                for action in actions:
+                    self.refresh.disable(action["_index"])
+                    yield action
+
+    def _bulk(self, pid_type, pool, bar):
+        """Send the index actions in parallel bulk requests."""
+        results = parallel_bulk(
+            self.client,
+            self._actions(pid_type, pool),
+            chunk_size=self.chunk_size,
+            thread_count=self.thread_count,
+            raise_on_error=False,
+            raise_on_exception=False,
+        )
+        for ok, item in results:
+            if not ok:
+                self._log_errors([(
+                    item.get("index", {}).get("_id"),
+                    item.get("index", {}).get("error"),
+                )])
+            bar.update(1)
+
+    def reindex(self, pid_type):
+        """Reindex the records of a pid type, returning the errors count."""
+        global _reindex_app
+
+        self.errors = 0
+        total = count_records(pid_type)
+        pool = None
+        if self.workers:
+            # the workers inherit the application by forking, and must
+            # open their own database connections
+            _reindex_app = self.app
+            db.session.remove()
+            db.engine.dispose()
+            pool = multiprocessing.get_context("fork").Pool(self.workers)
+        try:
+            with click.progressbar(length=total) as bar:
+                self._bulk(pid_type, pool, bar)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            self.refresh.restore()
+        return self.errors
@@ -8,7 +8,6 @@
 
 """CDS-ILS migrator API."""
 
-import json
 import logging
 
 import click
@@ -17,8 +16,9 @@ from invenio_app_ils.internal_locations.api import InternalLocation
 from invenio_app_ils.internal_locations.search import InternalLocationSearch
 from invenio_app_ils.proxies import current_app_ils
 
-from cds_ils.migrator.api import bulk_index_records, import_record, \
+from cds_ils.migrator.api import BulkIndexedRecords, import_record, \
     model_provider_by_rectype
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.errors import ItemMigrationError
 
 migrated_logger = logging.getLogger("migrated_documents")
@@ -39,8 +39,8 @@ def import_internal_locations_from_json(
         _,
     ) = current_app_ils.get_default_location_pid
 
-    with click.progressbar(json.load(dump_file)) as bar:
-        records = []
+    # index the new internal location and libraries records
+    with dump_progressbar(dump_file) as bar, BulkIndexedRecords() as records:
         for record in bar:
             click.echo(
                 'Importing internal location "{0}({1})"...'.format(
@@ -67,8 +67,6 @@ def import_internal_locations_from_json(
                         record, model, provider, legacy_id_key="legacy_id"
                     )
                     records.append(record)
-    # Index all new internal location and libraries records
-    bulk_index_records(records)
 
 
 def get_internal_location_by_legacy_recid(legacy_recid):
@@ -8,63 +8,46 @@
 
 """CDS-ILS migrator API."""
 
-import json
 import logging
 
 import click
 from elasticsearch_dsl import Q
 from invenio_app_ils.proxies import current_app_ils
 from invenio_db import db
-from invenio_pidstore.errors import PIDDoesNotExistError
 
-from cds_ils.literature.api import get_record_by_legacy_recid
 from cds_ils.migrator.api import import_record, model_provider_by_rectype
-from cds_ils.migrator.documents.api import get_document_by_barcode, \
-    get_document_by_legacy_recid
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.errors import DocumentMigrationError, ItemMigrationError
-from cds_ils.migrator.internal_locations.api import \
-    get_internal_location_by_legacy_recid
+from cds_ils.migrator.lookups import MigrationLookups
 from cds_ils.migrator.utils import clean_item_record
 
 migrated_logger = logging.getLogger("migrated_records")
 error_logger = logging.getLogger("records_errored")
 
 
-def set_internal_location_pid(record):
+def set_internal_location_pid(record, lookups):
     """Set internal location pid for item."""
-    # find internal location
-    int_loc_pid_value = get_internal_location_by_legacy_recid(
+    record["internal_location_pid"] = lookups.internal_location_pid(
         record["id_crcLIBRARY"]
-    ).pid.pid_value
-
-    record["internal_location_pid"] = int_loc_pid_value
+    )
 
 
-def set_document_pid(record):
+def set_document_pid(record, lookups):
     """Set document pid for item."""
-    document_cls = current_app_ils.document_record_cls
-
     # find document
-    record["document_pid"] = None
-    try:
-
-        record["document_pid"] = get_record_by_legacy_recid(
-            document_cls, record["id_bibrec"]
-        ).pid.pid_value
-    except DocumentMigrationError:
+    record["document_pid"] = lookups.document_pid(record["id_bibrec"])
+    if not record["document_pid"]:
         error_logger.error(
             "ITEM: {0} ERROR: Document {1} not found".format(
                 record["barcode"], record["id_bibrec"]
             )
         )
-        record["document_pid"] = None
         # try to match by barcodes in volumes of the multiparts
-    if not record["document_pid"]:
         try:
-            record["document_pid"] = get_document_by_barcode(
-                record["barcode"], record["id_bibrec"]
-            ).pid.pid_value
-        except PIDDoesNotExistError as e:
+            record["document_pid"] = lookups.document_pid_by_item_barcode(
+                record["barcode"]
+            )
+        except DocumentMigrationError as e:
             error_logger.error(
                 "ITEM: {0} ERROR: Document {1} not found".format(
                     record["barcode"], record["id_bibrec"]
@@ -77,8 +60,9 @@ def import_items_from_json(dump_file, rectype="item"):
     """Load items from json file."""
     dump_file = dump_file[0]
     model, provider = model_provider_by_rectype(rectype)
+    lookups = MigrationLookups()
 
-    with click.progressbar(json.load(dump_file)) as bar:
+    with dump_progressbar(dump_file) as bar:
         for record in bar:
             click.echo(
                 'Importing item "{0}({1})"...'.format(
@@ -86,11 +70,11 @@ def import_items_from_json(dump_file, rectype="item"):
                 )
             )
 
-            set_internal_location_pid(record)
+            set_internal_location_pid(record, lookups)
 
             try:
-                set_document_pid(record)
-            except PIDDoesNotExistError:
+                set_document_pid(record, lookups)
+            except DocumentMigrationError:
                 continue
 
             # clean the item JSON
@@ -104,21 +88,21 @@ def import_items_from_json(dump_file, rectype="item"):
                 continue
             try:
                 # check if the item already there
-                item = get_item_by_barcode(record["barcode"])
-                if item:
-                    click.secho(
-                        "Item {0}) already exists with pid: {1}".format(
-                            record["barcode"], item.pid
-                        ),
-                        fg="blue",
-                    )
-                    continue
+                item_pid = lookups.item_pid(record["barcode"])
+                click.secho(
+                    "Item {0}) already exists with pid: {1}".format(
+                        record["barcode"], item_pid
+                    ),
+                    fg="blue",
+                )
+                continue
             except ItemMigrationError:
                 try:
-                    import_record(
+                    item = import_record(
                         record, model, provider, legacy_id_key="barcode"
                     )
                     db.session.commit()
+                    lookups.add_item(record["barcode"], item["pid"])
                     migrated_logger.warning(
                         "ITEM: {0} OK".format(record["barcode"])
                     )
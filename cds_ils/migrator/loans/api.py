@@ -8,7 +8,6 @@
 
 """CDS-ILS migrator API."""
 
-import json
 import logging
 
 import click
@@ -18,9 +17,9 @@ from invenio_app_ils.proxies import current_app_ils
 from invenio_db import db
 
 from cds_ils.migrator.api import import_record, model_provider_by_rectype
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.errors import ItemMigrationError, LoanMigrationError
-from cds_ils.migrator.items.api import get_item_by_barcode
-from cds_ils.migrator.patrons.api import get_user_by_legacy_id
+from cds_ils.migrator.lookups import MigrationLookups
 
 migrated_logger = logging.getLogger("migrated_records")
 records_logger = logging.getLogger("records_errored")
@@ -30,23 +29,25 @@ def import_loans_from_json(dump_file):
     """Imports loan objects from JSON."""
     dump_file = dump_file[0]
     document_class = current_app_ils.document_record_cls
+    item_class = current_app_ils.item_record_cls
+    lookups = MigrationLookups()
     loans = []
     (
         default_location_pid_value,
         _,
     ) = current_app_ils.get_default_location_pid
-    with click.progressbar(json.load(dump_file)) as bar:
+    with dump_progressbar(dump_file) as bar:
         for record in bar:
             click.echo('Importing loan "{0}"...'.format(record["legacy_id"]))
-            user = get_user_by_legacy_id(record["id_crcBORROWER"])
-            if not user:
+            patron_pid = lookups.patron_pid(record["id_crcBORROWER"])
+            if not patron_pid:
                 # user was deleted, fallback to the AnonymousUser
                 anonym = current_app.config["ILS_PATRON_ANONYMOUS_CLASS"]
                 patron_pid = anonym.id
-            else:
-                patron_pid = user.pid
             try:
-                item = get_item_by_barcode(record["item_barcode"])
+                item = item_class.get_record_by_pid(
+                    lookups.item_pid(record["item_barcode"])
+                )
             except ItemMigrationError:
                 records_logger.error(
                     "LOAN: {0}, ERROR: barcode {1} not found.".format(
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# CDS-ILS is free software; you can redistribute it and/or modify it under
+# the terms of the MIT License; see LICENSE file for more details.
+
+"""CDS-ILS migrator lookups of legacy identifiers."""
+
+import click
+from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE
+from invenio_app_ils.internal_locations.search import InternalLocationSearch
+from invenio_app_ils.patrons.search import PatronsSearch
+from invenio_app_ils.proxies import current_app_ils
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from sqlalchemy.orm import aliased
+
+from cds_ils.config import RECORD_LEGACY_PID_TYPE
+from cds_ils.migrator.errors import DocumentMigrationError, \
+    ItemMigrationError, UserMigrationError
+
+
+def _as_list(value):
+    """Return the values of a field which may be repeated."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value]
+
+
+class LookupMap(object):
+    """Map keys to the pids of the records they identify.
+
+    Keys are compared as strings, since the legacy identifiers are numbers
+    in the dumps and strings in the records.
+    """
+
+    def __init__(self, pairs=()):
+        """Constructor."""
+        self.pids = {}
+        for key, pid in pairs:
+            self.add(key, pid)
+
+    def add(self, key, pid):
+        """Map a key to the pid of a record."""
+        pids = self.pids.setdefault(str(key), [])
+        if pid not in pids:
+            pids.append(pid)
+
+    def get(self, key):
+        """Return the pids of the records identified by a key."""
+        return self.pids.get(str(key), [])
+
+    def __len__(self):
+        """Return the number of keys."""
+        return len(self.pids)
+
+
+def _scan_fields(search, key_field, keys=None):
+    """Generate the key and pid pairs of the records of a search."""
+    keys = keys or (lambda source: _as_list(source.get(key_field)))
+    search = search.filter("exists", field=key_field) \
+        .source(["pid", key_field])
+    for hit in search.params(preserve_order=False).scan():
+        source = hit.to_dict()
+        for key in keys(source):
+            yield key, source["pid"]
+
+
+def _document_barcodes(source):
+    """Return the item barcodes of a migrated multipart document."""
+    items = source.get("_migration", {}).get("items", [])
+    return [item["barcode"] for item in _as_list(items) if "barcode" in item]
+
+
+def _document_legacy_recids():
+    """Generate the legacy recids of the documents, with their pids."""
+    legacy_pid = aliased(PersistentIdentifier)
+    document_pid = aliased(PersistentIdentifier)
+    query = (
+        db.session.query(legacy_pid.pid_value, document_pid.pid_value)
+        .join(
+            document_pid,
+            document_pid.object_uuid == legacy_pid.object_uuid,
+        )
+        .filter(
+            legacy_pid.pid_type == RECORD_LEGACY_PID_TYPE,
+            legacy_pid.status == PIDStatus.REGISTERED,
+            document_pid.pid_type == DOCUMENT_PID_TYPE,
+            document_pid.status == PIDStatus.REGISTERED,
+        )
+    )
+    return query.yield_per(1000)
+
+
+class MigrationLookups(object):
+    """Legacy identifiers of the migrated records, loaded in bulk.
+
+    Each mapping is loaded with a single scroll search or database query
+    the first time it is needed, so that the records of a dump can be
+    migrated without searching them one by one.
+    """
+
+    LOADERS = {
+        "internal_locations": lambda: _scan_fields(
+            InternalLocationSearch(), "legacy_id"
+        ),
+        "documents": _document_legacy_recids,
+        "documents_barcodes": lambda: _scan_fields(
+            current_app_ils.document_search_cls(),
+            "_migration.items.barcode",
+            keys=_document_barcodes,
+        ),
+        "items": lambda: _scan_fields(
+            current_app_ils.item_search_cls(), "barcode"
+        ),
+        "patrons": lambda: _scan_fields(PatronsSearch(), "legacy_id"),
+    }
+
+    def __init__(self):
+        """Constructor."""
+        self.maps = {}
+
+    def _get_map(self, name):
+        """Return a mapping, loading it the first time."""
+        if name not in self.maps:
+            click.secho("Loading the {} lookup...".format(name), fg="blue")
+            self.maps[name] = LookupMap(self.LOADERS[name]())
+        return self.maps[name]
+
+    def internal_location_pid(self, legacy_id):
+        """Return the pid of the internal location of a legacy library."""
+        pids = self._get_map("internal_locations").get(legacy_id)
+        if not pids:
+            click.secho(
+                "no internal location found with legacy id {}".format(
+                    legacy_id
+                ),
+                fg="red",
+            )
+            raise ItemMigrationError(
+                "no internal location found with legacy id {}".format(
+                    legacy_id
+                )
+            )
+        elif len(pids) > 1:
+            raise ItemMigrationError(
+                "found more than one internal location with legacy id {}"
+                .format(legacy_id)
+            )
+        return pids[0]
+
+    def document_pid(self, legacy_recid):
+        """Return the pid of the document of a legacy recid, if any."""
+        pids = self._get_map("documents").get(legacy_recid)
+        return pids[0] if pids else None
+
+    def document_pid_by_item_barcode(self, barcode):
+        """Return the pid of the multipart document of a legacy item."""
+        pids = self._get_map("documents_barcodes").get(barcode)
+        if len(pids) != 1:
+            click.secho(
+                "no document found with barcode {}".format(barcode),
+                fg="red",
+            )
+            raise DocumentMigrationError(
+                "found {0} documents with barcode {1}".format(
+                    len(pids), barcode
+                )
+            )
+        return pids[0]
+
+    def item_pid(self, barcode):
+        """Return the pid of the item with a barcode."""
+        pids = self._get_map("items").get(barcode)
+        if not pids:
+            click.secho(
+                "no item found with barcode {}".format(barcode), fg="red"
+            )
+            raise ItemMigrationError(
+                "no item found with barcode {}".format(barcode)
+            )
+        elif len(pids) > 1:
+            raise ItemMigrationError(
+                "found more than one item with barcode {}".format(barcode)
+            )
+        return pids[0]
+
+    def add_item(self, barcode, pid):
+        """Add an item migrated after the lookup was loaded."""
+        self._get_map("items").add(barcode, pid)
+
+    def patron_pid(self, legacy_id):
+        """Return the pid of the patron of a legacy borrower, if any."""
+        pids = self._get_map("patrons").get(legacy_id)
+        if not pids:
+            click.secho(
+                "no user found with legacy_id {}".format(legacy_id), fg="red"
+            )
+            return None
+        elif len(pids) > 1:
+            raise UserMigrationError(
+                "found more than one user with legacy_id {}".format(legacy_id)
+            )
+        return pids[0]
@@ -8,7 +8,6 @@
 
 """CDS-ILS migrator API."""
 
-import json
 import logging
 
 import click
@@ -19,6 +18,7 @@ from invenio_app_ils.patrons.search import PatronsSearch
 from invenio_db import db
 from invenio_oauthclient.models import RemoteAccount
 
+from cds_ils.migrator.dump_reader import dump_progressbar
 from cds_ils.migrator.errors import UserMigrationError
 from cds_ils.patrons.api import Patron
 
@@ -28,7 +28,7 @@ migrated_logger = logging.getLogger("migrated_records")
 def import_users_from_json(dump_file):
     """Imports additional user data from JSON."""
     dump_file = dump_file[0]
-    with click.progressbar(json.load(dump_file)) as bar:
+    with dump_progressbar(dump_file) as bar:
         for record in bar:
             click.echo(
                 'Importing user "{0}({1})"...'.format(
@@ -41,6 +41,8 @@ install_requires = [
     "invenio-oauthclient>=1.3.5,<1.4.0",
     "invenio-app-ils[lorem,elasticsearch7,postgresql]==1.0.0a21",
     "sentry-sdk>=0.10.2",
+    # entry points of the importer providers
+    'importlib-metadata>=1.0.0; python_version<"3.8"',
     # migrator deps
     "cds-dojson==0.9.0",
     "lxml>=3.5.0",
@@ -103,6 +105,7 @@ setup(
             "cds_ils_tasks = cds_ils.literature.tasks",
             "cds_ils_ldap_tasks = cds_ils.ldap.tasks",
             "cds_ils_mail_tasks = cds_ils.mail.tasks",
+            "cds_ils_importer_tasks = cds_ils.importer.api",
         ],
         "invenio_i18n.translations": ["messages = cds_ils"],
         "invenio_access.actions": [
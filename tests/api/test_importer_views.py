@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# CDS-ILS is free software; you can redistribute it and/or modify it under
+# the terms of the MIT License; see LICENSE file for more details.
+
+import io
+import json
+from datetime import datetime, timedelta
+
+from flask import url_for
+from invenio_accounts.testutils import login_user_via_session
+from invenio_db import db
+
+from cds_ils.importer.models import ImporterAgent, ImporterMode, \
+    ImporterTaskEntryWriter, ImporterTaskLog
+
+
+def create_task(source_path):
+    """Create a running import task."""
+    return ImporterTaskLog.create(dict(
+        agent=ImporterAgent.USER,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+        source_path=source_path,
+    ))
+
+
+def test_check_task_pages(app, admin, client, mocker, tmp_path):
+    """Test paging through the entries of a task."""
+    mocker.patch.dict(app.config, {"CDS_ILS_IMPORTER_CHECK_PAGE_SIZE": 2})
+    login_user_via_session(client, email=admin.email)
+    log = create_task(str(tmp_path / "springer.xml"))
+    writer = ImporterTaskEntryWriter(flush_size=10, flush_interval=60)
+    # committed in another order than their index
+    for entry_index in (3, 0, 4, 1):
+        writer.add_unchanged(dict(import_id=log.id, entry_index=entry_index))
+    writer.add_failure(
+        dict(import_id=log.id, entry_index=2), Exception("failed")
+    )
+    writer.flush()
+    db.session.commit()
+
+    resp = client.get(
+        url_for("invenio_app_ils_importer.check", log_id=log.id)
+    )
+    assert resp.status_code == 200
+    pages = [resp.json]
+    while pages[-1]["has_more"]:
+        resp = client.get(url_for(
+            "invenio_app_ils_importer.check_next",
+            log_id=log.id,
+            next_entry=pages[-1]["next_entry"],
+        ))
+        pages.append(resp.json)
+
+    assert [
+        [report["index"] for report in page["reports"]] for page in pages
+    ] == [[3, 0], [4, 1], [2]]
+    assert [page["next_entry"] for page in pages] == [2, 4, 5]
+    assert pages[-1]["reports"][0] == dict(
+        index=2, success=False, message="Exception: failed"
+    )
+    for page in pages:
+        assert page["loaded_entries"] == 5
+        assert page["unchanged_entries"] == 4
+        assert page["failed_entries"] == 1
+
+    # no entries after the last page
+    resp = client.get(url_for(
+        "invenio_app_ils_importer.check_next", log_id=log.id, next_entry=5
+    ))
+    assert resp.json["reports"] == []
+    assert resp.json["next_entry"] == 5
+    assert not resp.json["has_more"]
+
+
+def test_import_unknown_provider(app, admin, client):
+    """Test refusing to import the records of an unknown provider."""
+    login_user_via_session(client, email=admin.email)
+
+    resp = client.post(
+        url_for("invenio_app_ils_importer.importer"),
+        data=dict(
+            provider="unknown",
+            mode="create",
+            file=(io.BytesIO(b"<collection/>"), "records.xml"),
+        ),
+        content_type="multipart/form-data",
+    )
+
+    assert resp.status_code == 400
+    assert ImporterTaskLog.query.count() == 0
+
+
+def test_resume_task(app, admin, client, mocker, tmp_path):
+    """Test resuming a stale task in the background."""
+    thread = mocker.patch("cds_ils.importer.views.Thread")
+    login_user_via_session(client, email=admin.email)
+    source_path = tmp_path / "springer.xml"
+    source_path.write_text("<collection/>")
+    log = create_task(str(source_path))
+
+    def resume_url(log_id):
+        return url_for("invenio_app_ils_importer.resume", log_id=log_id)
+
+    resp = client.post(resume_url(log.id + 1))
+    assert resp.status_code == 404
+
+    # the task is still running
+    resp = client.post(resume_url(log.id))
+    assert resp.status_code == 400
+    assert not thread.called
+
+    timeout = app.config["CDS_ILS_IMPORTER_RESUME_TIMEOUT"]
+    log.heartbeat_time = datetime.now() - timedelta(seconds=timeout + 1)
+    db.session.commit()
+
+    resp = client.post(resume_url(log.id))
+    assert resp.status_code == 202
+    assert json.loads(resp.data) == {"id": log.id}
+    thread.assert_called_once_with(
+        target=mocker.ANY, args=(log.id, False)
+    )
+    thread.return_value.start.assert_called_once_with()
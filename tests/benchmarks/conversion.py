@@ -0,0 +1,291 @@
+"""Benchmark the MARCXML to JSON conversion of each provider.
+
+The corpora are generated by copying the provider records of
+``tests/importer/data``, so no database or search cluster is needed. Each
+provider is measured in its own process, reporting records per second and
+peak RSS for the conversion stages and for ``XMLRecordToJson.dump``.
+
+Run it with ``python -m tests.benchmarks.conversion``. With ``--save`` the
+results are stored as the baseline, which the following runs are compared
+to: the run fails when the throughput of a stage drops below the baseline
+by more than the given tolerance. The throughput depends on the machine, so
+the baseline must be saved on the machine running the comparison.
+
+With ``--compare-ref`` the baseline is measured in the same run instead, on
+a checkout of the merge base of ``HEAD`` and the given git reference, e.g.
+``--compare-ref origin/master`` to check the changes of a branch.
+"""
+
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from cds_dojson.marc21.utils import create_record
+from cds_dojson.matcher import matcher
+from flask import Flask
+from lxml import etree
+
+from cds_ils import config
+from cds_ils.importer import marc21
+from cds_ils.importer.errors import LossyConversion, ManualImportRequired, \
+    MissingRequiredField, UnexpectedValue
+from cds_ils.importer.handlers import importer_exception_handler
+from cds_ils.importer.parse_xml import get_records_list
+from cds_ils.importer.XMLRecordToJson import XMLRecordToJson
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "importer", "data"
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(DATA_DIR))
+
+MARC_NAMESPACE = "http://www.loc.gov/MARC21/slim"
+
+LEADER = "00000nam a2200000 a 4500"
+
+CDS_RECORD = """
+<record xmlns="http://www.loc.gov/MARC21/slim">
+    <controlfield tag="001">2000001</controlfield>
+    <controlfield tag="003">SzGeCERN</controlfield>
+    <datafield tag="020" ind1=" " ind2=" ">
+        <subfield code="a">9780691090856</subfield>
+        <subfield code="u">print version</subfield>
+    </datafield>
+    <datafield tag="100" ind1=" " ind2=" ">
+        <subfield code="a">Doe, John</subfield>
+    </datafield>
+    <datafield tag="245" ind1=" " ind2=" ">
+        <subfield code="a">An introduction to particle physics</subfield>
+    </datafield>
+    <datafield tag="690" ind1="C" ind2=" ">
+        <subfield code="a">BOOK</subfield>
+    </datafield>
+    <datafield tag="980" ind1=" " ind2=" ">
+        <subfield code="a">BOOK</subfield>
+    </datafield>
+</record>
+"""
+
+PROVIDERS = {
+    "cds": None,
+    "springer": "springer_record.xml",
+    "ebl": "ebl_record.xml",
+    "safari": "safari_record.xml",
+}
+
+EXCEPTION_HANDLERS = {
+    UnexpectedValue: importer_exception_handler,
+    MissingRequiredField: importer_exception_handler,
+    ManualImportRequired: importer_exception_handler,
+}
+
+
+def load_record(provider):
+    """Return the MARCXML record element of the provider fixture."""
+    filename = PROVIDERS[provider]
+    if filename is None:
+        source = CDS_RECORD.encode("utf-8")
+    else:
+        with open(os.path.join(DATA_DIR, filename), "rb") as fp:
+            source = fp.read()
+    return next(etree.fromstring(source).iter("{*}record"))
+
+
+def generate_corpus(provider, size):
+    """Return a MARCXML collection made of copies of the provider record."""
+    record = load_record(provider)
+    if next(record.iter("{*}leader"), None) is None:
+        leader = etree.Element("{{{0}}}leader".format(MARC_NAMESPACE))
+        leader.text = LEADER
+        record.insert(0, leader)
+    recid = next(
+        field for field in record.iter("{*}controlfield")
+        if field.get("tag") == "001"
+    )
+    original_recid = recid.text
+
+    collection = etree.Element(
+        "{{{0}}}collection".format(MARC_NAMESPACE),
+        nsmap={None: MARC_NAMESPACE},
+    )
+    for index in range(size):
+        recid.text = "{0}-{1}".format(original_recid, index)
+        collection.append(etree.fromstring(etree.tostring(record)))
+    return etree.tostring(collection, xml_declaration=True, encoding="UTF-8")
+
+
+def peak_rss():
+    """Return the peak resident set size of the process in MB."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def convert(source):
+    """Parse, translate and check the missing rules of each record."""
+    for record in get_records_list(source):
+        blob = create_record(record)
+        model = matcher(blob, marc21.entry_point_models)
+        model.do(blob, exception_handlers=EXCEPTION_HANDLERS)
+        model.missing(blob)
+
+
+def dump(source):
+    """Convert each record with ``XMLRecordToJson.dump``."""
+    for record in get_records_list(source):
+        try:
+            XMLRecordToJson(record).dump()
+        except LossyConversion:
+            pass
+
+
+def measure(provider, size):
+    """Measure the conversion stages of a provider corpus."""
+    app = Flask(__name__)
+    app.config.from_object(config)
+    corpus = generate_corpus(provider, size)
+    # the copies raise the same conversion errors, do not log each of them
+    logging.disable(logging.ERROR)
+
+    results = {}
+    with app.app_context():
+        for stage, func in (("convert", convert), ("dump", dump)):
+            start = time.perf_counter()
+            func(io.BytesIO(corpus))
+            elapsed = time.perf_counter() - start
+            results[stage] = dict(
+                records_per_second=round(size / elapsed, 2),
+                peak_rss_mb=round(peak_rss(), 2),
+            )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the stages slower than the baseline, beyond the tolerance."""
+    regressions = []
+    for provider, stages in results.items():
+        for stage, result in stages.items():
+            expected = baseline.get(provider, {}).get(stage)
+            if not expected:
+                continue
+            minimum = expected["records_per_second"] * (1 - tolerance)
+            if result["records_per_second"] < minimum:
+                regressions.append((provider, stage, result, expected))
+    return regressions
+
+
+def git(*args):
+    """Run a git command in the repository, returning its output."""
+    return subprocess.check_output(
+        ("git",) + args, cwd=REPOSITORY_DIR, universal_newlines=True
+    ).strip()
+
+
+def measure_ref(ref, providers, size):
+    """Measure the conversion of the merge base of ``HEAD`` and a ref.
+
+    The merge base is checked out in a temporary worktree, which comes
+    first in the path of a process running this script, so that the same
+    corpora are converted by the code of the merge base.
+    """
+    commit = git("merge-base", "HEAD", ref)
+    directory = tempfile.mkdtemp()
+    worktree = os.path.join(directory, "worktree")
+    git("worktree", "add", "--detach", worktree, commit)
+    try:
+        baseline_path = os.path.join(directory, "baseline.json")
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--records", str(size), "--baseline", baseline_path, "--save",
+        ]
+        for provider in providers:
+            command += ["--provider", provider]
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            path for path in (worktree, env.get("PYTHONPATH")) if path
+        )
+        print("Baseline at {0}".format(commit))
+        subprocess.check_call(command, env=env)
+        with open(baseline_path) as fp:
+            return json.load(fp)
+    finally:
+        git("worktree", "remove", "--force", worktree)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    """Run the benchmarks and compare them to the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument(
+        "--provider", action="append", choices=sorted(PROVIDERS)
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare-ref")
+    args = parser.parse_args()
+    providers = args.provider or sorted(PROVIDERS)
+
+    baseline = None
+    if args.compare_ref:
+        baseline = measure_ref(args.compare_ref, providers, args.records)
+        print("Current tree")
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for provider in providers:
+        # a fresh process for each provider, for its own peak RSS
+        with context.Pool(1) as pool:
+            results[provider] = pool.apply(measure, (provider, args.records))
+        for stage, result in results[provider].items():
+            print(
+                "{0:<10} {1:<8} {2:>10.2f} records/s {3:>8.2f} MB".format(
+                    provider,
+                    stage,
+                    result["records_per_second"],
+                    result["peak_rss_mb"],
+                )
+            )
+
+    if args.save:
+        with open(args.baseline, "w") as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        return
+
+    if baseline is None:
+        if not os.path.exists(args.baseline):
+            print("No baseline found at {0}, skipping the comparison.".format(
+                args.baseline
+            ))
+            return
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+    regressions = compare(results, baseline, args.tolerance)
+    for provider, stage, result, expected in regressions:
+        print(
+            "REGRESSION {0} {1}: {2} records/s, baseline {3}".format(
+                provider,
+                stage,
+                result["records_per_second"],
+                expected["records_per_second"],
+            )
+        )
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
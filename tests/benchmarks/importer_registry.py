@@ -0,0 +1,54 @@
+"""Benchmark the lookup of the importer class of each imported record.
+
+Run it with ``python -m tests.benchmarks.importer_registry``. The run
+fails when the registry lookup takes more than ``--max-ratio`` times the
+entry point lookup, both being measured in the same run.
+"""
+
+import argparse
+import sys
+import timeit
+
+import pkg_resources
+
+from cds_ils.importer.providers import get_importer_class
+
+
+def load_entry_point(provider):
+    """Look up the importer class as done before the registry."""
+    return pkg_resources.load_entry_point(
+        "cds-ils", "cds_ils.importers", provider
+    )
+
+
+def main():
+    """Print the lookup overhead per record of a feed."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--provider", default="springer")
+    parser.add_argument("--max-ratio", type=float, default=1.0)
+    args = parser.parse_args()
+
+    totals = {}
+    for name, lookup in (
+        ("pkg_resources", load_entry_point),
+        ("registry", get_importer_class),
+    ):
+        totals[name] = timeit.timeit(
+            lambda: lookup(args.provider), number=args.records
+        )
+        print(
+            "{0:<15} {1:>10.3f} s total {2:>10.2f} us/record".format(
+                name, totals[name], totals[name] / args.records * 1e6
+            )
+        )
+
+    ratio = totals["registry"] / totals["pkg_resources"]
+    if ratio > args.max_ratio:
+        print("REGRESSION registry: {0:.2f} times the entry point lookup, "
+              "maximum {1:.2f}".format(ratio, args.max_ratio))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
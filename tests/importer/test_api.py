@@ -0,0 +1,214 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from invenio_db import db
+
+from cds_ils.importer.api import _dispatch_chunks, _split_chunks, \
+    import_chunk, resume_import
+from cds_ils.importer.cli import resume
+from cds_ils.importer.errors import ImporterTaskNotResumable
+from cds_ils.importer.models import ImporterAgent, ImporterMode, \
+    ImporterTaskEntryWriter, ImporterTaskLog, ImporterTaskStatus
+from cds_ils.importer.parse_xml import get_source_records, \
+    remove_chunk_files
+
+
+def write_source(path, count):
+    """Write a source file of records numbered from 0."""
+    path.write_text(
+        """<collection xmlns="http://www.loc.gov/MARC21/slim">{}"""
+        """</collection>""".format("".join(
+            """<record><controlfield tag="001">{}</controlfield>"""
+            """</record>""".format(index)
+            for index in range(count)
+        ))
+    )
+    return str(path)
+
+
+def create_task(source_path, entries_count):
+    """Create a running task importing a source file."""
+    return ImporterTaskLog.create(dict(
+        agent=ImporterAgent.CLI,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+        source_path=source_path,
+        entries_count=entries_count,
+    ))
+
+
+@pytest.fixture()
+def chunks_config(app, mocker, tmp_path):
+    """Split the tasks in chunks of 2 records, in a temporary directory."""
+    uploads_path = tmp_path / "uploads"
+    uploads_path.mkdir()
+    mocker.patch.dict(app.config, {
+        "CDS_ILS_IMPORTER_CHUNK_SIZE": 2,
+        "CDS_ILS_IMPORTER_UPLOADS_PATH": str(uploads_path),
+    })
+    return uploads_path
+
+
+def fake_import_records(log_id, records, provider, mode, source_type,
+                        start=0, **kwargs):
+    """Report the records as unchanged, failing on the record 4."""
+    writer = ImporterTaskEntryWriter(flush_size=10, flush_interval=60)
+    for index, record in enumerate(records, start):
+        if record[0].text == "4":
+            raise Exception("failed")
+        writer.add_unchanged(dict(import_id=log_id, entry_index=index))
+        writer.flush()
+        db.session.commit()
+
+
+def test_split_chunks(app, chunks_config, tmp_path):
+    """Test splitting the records to import in chunk files."""
+    source_path = write_source(tmp_path / "records.xml", 5)
+
+    chunks = _split_chunks(source_path, [(0, 3), (4, 5)])
+
+    assert [(start, end) for start, end, _ in chunks] == [
+        (0, 2), (2, 3), (4, 5)
+    ]
+    assert [
+        [record[0].text for record in get_source_records(chunk_path)]
+        for _, _, chunk_path in chunks
+    ] == [["0", "1"], ["2"], ["4"]]
+
+    remove_chunk_files(chunks)
+    assert list(chunks_config.iterdir()) == []
+
+
+def test_import_chunks(app, db, chunks_config, tmp_path, mocker):
+    """Test ending the task with its last imported chunk."""
+    mocker.patch(
+        "cds_ils.importer.api.import_records", fake_import_records
+    )
+    delay = mocker.patch.object(import_chunk, "delay")
+    source_path = write_source(tmp_path / "records.xml", 5)
+    log = create_task(source_path, 5)
+
+    _dispatch_chunks(
+        log, source_path, "marcxml", "springer", "create", [(0, 5)]
+    )
+    assert log.chunks_count == delay.call_count == 3
+    chunk_paths = [call[0][1] for call in delay.call_args_list]
+    assert all(os.path.exists(chunk_path) for chunk_path in chunk_paths)
+
+    for call in delay.call_args_list[:2]:
+        import_chunk(*call[0])
+    assert log.is_running()
+    assert log.finished_chunks == 2
+
+    with pytest.raises(Exception, match="failed"):
+        import_chunk(*delay.call_args_list[2][0])
+
+    # the counters of the chunks are added up
+    assert log.loaded_entries == log.unchanged_entries == 4
+    assert log.finished_chunks == 3
+    assert log.failed_chunks == 1
+    assert log.status == ImporterTaskStatus.FAILED
+    assert log.message == "Exception: failed"
+    assert log.end_time
+    assert not any(os.path.exists(chunk_path) for chunk_path in chunk_paths)
+
+
+def test_dispatch_chunks_failure(app, db, chunks_config, tmp_path, mocker):
+    """Test failing the task when its chunks cannot be dispatched."""
+    mocker.patch(
+        "cds_ils.importer.api.import_records", fake_import_records
+    )
+    delay = mocker.patch.object(
+        import_chunk, "delay", side_effect=[None, ConnectionError("down")]
+    )
+    source_path = write_source(tmp_path / "records.xml", 4)
+    log = create_task(source_path, 4)
+
+    with pytest.raises(ConnectionError):
+        _dispatch_chunks(
+            log, source_path, "marcxml", "springer", "create", [(0, 4)]
+        )
+
+    # the task only waits for the dispatched chunk
+    assert log.chunks_count == 1
+    assert log.status == ImporterTaskStatus.FAILED
+    assert log.message == "ConnectionError: down"
+    dispatched_path = delay.call_args_list[0][0][1]
+    assert [str(path) for path in chunks_config.iterdir()] == [
+        dispatched_path
+    ]
+
+    import_chunk(*delay.call_args_list[0][0])
+    assert log.finished_chunks == 1
+    assert log.status == ImporterTaskStatus.FAILED
+    assert list(chunks_config.iterdir()) == []
+
+
+def create_stale_task(app, source_path, entries_count, processed):
+    """Create a task interrupted after processing some records."""
+    log = create_task(source_path, entries_count)
+    writer = ImporterTaskEntryWriter(flush_size=10, flush_interval=60)
+    for entry_index in processed:
+        writer.add_unchanged(dict(import_id=log.id, entry_index=entry_index))
+    writer.flush()
+    timeout = app.config["CDS_ILS_IMPORTER_RESUME_TIMEOUT"]
+    log.heartbeat_time = datetime.now() - timedelta(seconds=timeout + 1)
+    db.session.commit()
+    return log
+
+
+def test_resume_import(app, db, chunks_config, tmp_path, mocker):
+    """Test importing the records left by a stale task."""
+    imported = []
+
+    def import_records(log_id, records, provider, mode, source_type,
+                       start=0, **kwargs):
+        imported.append([record[0].text for record in records])
+
+    mocker.patch("cds_ils.importer.api.import_records", import_records)
+    source_path = write_source(tmp_path / "records.xml", 6)
+    log = create_stale_task(app, source_path, 6, (0, 1, 3))
+
+    resume_import(log.id)
+
+    # the unprocessed records, in chunks of 2 records
+    assert imported == [["2"], ["4", "5"]]
+    assert log.status == ImporterTaskStatus.SUCCEEDED
+    assert list(chunks_config.iterdir()) == []
+
+
+def test_resume_import_not_resumable(app, db, tmp_path, mocker):
+    """Test refusing to resume a task still running, or unknown."""
+    import_records = mocker.patch("cds_ils.importer.api.import_records")
+    source_path = write_source(tmp_path / "records.xml", 2)
+    log = create_task(source_path, 2)
+
+    with pytest.raises(ImporterTaskNotResumable):
+        resume_import(log.id)
+    with pytest.raises(ImporterTaskNotResumable):
+        resume_import(log.id + 1)
+
+    assert log.is_running()
+    assert not import_records.called
+
+
+def test_resume_cli(app, db, chunks_config, tmp_path, mocker):
+    """Test resuming a task from the command line."""
+    mocker.patch(
+        "cds_ils.importer.api.import_records", fake_import_records
+    )
+    source_path = write_source(tmp_path / "records.xml", 2)
+    log = create_task(source_path, 2)
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(resume, [str(log.id)])
+    assert result.exit_code != 0
+    assert "cannot be resumed" in result.output
+
+    result = runner.invoke(resume, [str(log.id), "--force"])
+    assert result.exit_code == 0
+    assert "Unchanged: 2" in result.output
+    assert log.status == ImporterTaskStatus.SUCCEEDED
@@ -1,5 +1,7 @@
-from cds_ils.importer.documents.api import fuzzy_search_document
-from cds_ils.importer.documents.importer import DocumentImporter
+from cds_ils.importer.documents.api import fuzzy_search_document, \
+    search_documents_by_identifiers
+from cds_ils.importer.documents.importer import DocumentIdentifiersIndex, \
+    DocumentImporter
 
 from ..helpers import load_json_from_datadir
 
@@ -63,3 +65,134 @@ def test_fuzzy_matching(importer_test_data):
     results = fuzzy_search_document(data_to_update["title"], authors).scan()
     matches = [x.pid for x in results]
     assert matches == ["docid-5"]
+
+
+def test_prefetch_matches(importer_test_data):
+    helper_metadata_fields = ("_items", "agency_code")
+    metadata_provider = "springer"
+    update_document_fields = ("identifiers",)
+
+    data_to_update = load_json_from_datadir(
+        "match_testing_documents.json", relpath="importer"
+    )
+
+    document_importers = [
+        DocumentImporter(
+            json_data,
+            helper_metadata_fields,
+            metadata_provider,
+            update_document_fields,
+        )
+        for json_data in data_to_update
+    ]
+    DocumentImporter.prefetch_matches(document_importers)
+
+    # the batch returns the same matches as the single record searches
+    for document_importer, json_data in zip(
+        document_importers, data_to_update
+    ):
+        single_importer = DocumentImporter(
+            json_data,
+            helper_metadata_fields,
+            metadata_provider,
+            update_document_fields,
+        )
+        assert (
+            document_importer.search_for_matching_documents()
+            == single_importer.search_for_matching_documents()
+        )
+        assert [
+            x.pid for x in document_importer.fuzzy_match_documents()
+        ] == [x.pid for x in single_importer.fuzzy_match_documents()]
+
+    assert document_importers[0].search_for_matching_documents() == [
+        "docid-1"
+    ]
+
+
+def test_search_documents_by_identifiers(importer_test_data):
+    search = search_documents_by_identifiers([
+        {"scheme": "ISBN", "value": "0123456789"},
+        {"scheme": "DOI", "value": "0123456789"},
+        {"scheme": "ISBN", "value": "not-existing"},
+    ])
+    assert sorted(hit.pid for hit in search.scan()) == ["docid-1", "docid-3"]
+
+    # the scheme of the identifiers is matched
+    search = search_documents_by_identifiers([
+        {"scheme": "ISBN", "value": "0123456789"},
+    ])
+    assert [hit.pid for hit in search.scan()] == ["docid-1"]
+
+    assert search_documents_by_identifiers([
+        {"scheme": "ISSN", "value": "0123456789"},
+    ]) is None
+
+
+def test_identifiers_index(importer_test_data):
+    """Test matching the documents written by the previous records."""
+    data_to_update = load_json_from_datadir(
+        "match_testing_documents.json", relpath="importer"
+    )
+    identifiers_index = DocumentIdentifiersIndex()
+    document_importer = DocumentImporter(
+        data_to_update[0],
+        ("_items", "agency_code"),
+        "springer",
+        ("identifiers",),
+        identifiers_index=identifiers_index,
+    )
+
+    # a document created by a previous record, not searchable yet
+    identifiers_index.add({
+        "pid": "docid-new",
+        "identifiers": [
+            {"scheme": "ISBN", "value": "0123456789"},
+            {"scheme": "ISSN", "value": "0123456789"},
+        ],
+    })
+    assert identifiers_index.search([
+        {"scheme": "ISSN", "value": "0123456789"},
+    ]) == []
+    matches = document_importer.search_for_matching_documents()
+    assert matches == ["docid-new", "docid-1"]
+
+    # once searchable, the document is not matched twice
+    identifiers_index.add({
+        "pid": "docid-1",
+        "identifiers": [{"scheme": "ISBN", "value": "0123456789"}],
+    })
+    matches = document_importer.search_for_matching_documents()
+    assert matches == ["docid-new", "docid-1"]
+
+    # its creation was rolled back
+    identifiers_index.remove("docid-new")
+    matches = document_importer.search_for_matching_documents()
+    assert matches == ["docid-1"]
+
+
+def test_invalidate_prefetched_matches(importer_test_data):
+    """Test searching again after a document write in the batch."""
+    data_to_update = load_json_from_datadir(
+        "match_testing_documents.json", relpath="importer"
+    )
+    document_importer = DocumentImporter(
+        data_to_update[2],
+        ("_items", "agency_code"),
+        "springer",
+        ("identifiers",),
+        identifiers_index=DocumentIdentifiersIndex(),
+    )
+    DocumentImporter.prefetch_matches([document_importer])
+    prefetched_identifiers = document_importer._prefetched_identifiers_matches
+
+    document_importer.invalidate_prefetched_matches()
+
+    # the identifiers index finds the written documents by identifier
+    assert (
+        document_importer._prefetched_identifiers_matches
+        is prefetched_identifiers
+    )
+    assert document_importer._prefetched_title_matches is None
+    assert document_importer._prefetched_fuzzy_matches is None
+    assert document_importer.search_for_matching_documents() == ["docid-4"]
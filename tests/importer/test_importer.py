@@ -1,9 +1,23 @@
+import os
 import time
+import uuid
+from copy import deepcopy
 
+import pytest
+from invenio_app_ils.errors import IlsValidationError
 from invenio_app_ils.proxies import current_app_ils
+from invenio_pidstore.errors import PIDDoesNotExistError
 
+from cds_ils.importer.api import _convert_records, _import_entry
+from cds_ils.importer.documents.importer import DocumentIdentifiersIndex
+from cds_ils.importer.eitems.api import get_eitems_records
 from cds_ils.importer.importer import Importer
-from cds_ils.importer.series.importer import SeriesImporter
+from cds_ils.importer.indexer import ImporterBulkIndexer
+from cds_ils.importer.models import ImporterAgent, ImporterMode, \
+    ImporterTaskEntryWriter, ImporterTaskLog
+from cds_ils.importer.parse_xml import get_records_list
+from cds_ils.importer.series.importer import SeriesImporter, \
+    SeriesMatchesCache
 from tests.helpers import load_json_from_datadir
 
 
@@ -155,3 +169,186 @@ def test_add_document_to_serial(app, db):
         created_document["relations_extra_metadata"]["serial"][0]["volume"]
         == "26"
     )
+
+
+def test_import_documents_bulk_indexing(app, db):
+    document_search_cls = current_app_ils.document_search_cls
+    eitem_search_cls = current_app_ils.eitem_search_cls
+
+    json_data = load_json_from_datadir(
+        "create_documents_data.json", relpath="importer"
+    )
+    bulk_indexer = ImporterBulkIndexer()
+    importer = Importer(json_data[0], "springer", bulk_indexer=bulk_indexer)
+    report = importer.import_record()
+    assert report["created"]
+    assert not bulk_indexer.record_ids
+
+    db.session.commit()
+    bulk_indexer.commit()
+    document_pid = report["created"]["pid"]
+    assert str(report["created"].id) in bulk_indexer.record_ids
+    assert str(report["created_eitem"].id) in bulk_indexer.record_ids
+
+    bulk_indexer.flush()
+    assert not bulk_indexer.record_ids
+
+    search = document_search_cls().filter("term", pid=document_pid)
+    assert search.execute().hits.total.value == 1
+    search = eitem_search_cls().search_by_document_pid(
+        document_pid=document_pid
+    )
+    assert search.execute().hits.total.value == 1
+
+
+def test_bulk_indexer_discards_rolled_back_records(app, mocker):
+    bulk_indexer = ImporterBulkIndexer()
+    kept, rolled_back, deleted = (
+        mocker.Mock(id=uuid.uuid4()) for _ in range(3)
+    )
+    with bulk_indexer.begin_nested():
+        bulk_indexer.add_documents(kept)
+    with pytest.raises(ValueError):
+        with bulk_indexer.begin_nested():
+            bulk_indexer.add_documents(rolled_back)
+            raise ValueError()
+    bulk_indexer.commit()
+    assert bulk_indexer.record_ids == {str(kept.id)}
+
+    bulk_indexer.delete_eitems(deleted)
+    bulk_indexer.discard()
+    bulk_indexer.commit()
+    assert not bulk_indexer.deleted
+
+
+def test_import_entry_rollback(app, db, mocker):
+    """Test rolling back a failing record, keeping the rest of its batch."""
+    document_cls = current_app_ils.document_record_cls
+    json_data = load_json_from_datadir(
+        "create_documents_data.json", relpath="importer"
+    )
+    failing_json = deepcopy(json_data[0])
+    failing_json["title"] = "A record failing to be indexed"
+    failing_json["identifiers"] = [dict(scheme="DOI", value="9876543210")]
+    log = ImporterTaskLog.create(dict(
+        agent=ImporterAgent.CLI,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+    ))
+    entry_writer = ImporterTaskEntryWriter(flush_size=10, flush_interval=60)
+    bulk_indexer = ImporterBulkIndexer()
+    identifiers_index = DocumentIdentifiersIndex()
+    importer, failing_importer = (
+        Importer(
+            data, "springer", bulk_indexer=bulk_indexer,
+            identifiers_index=identifiers_index,
+        )
+        for data in (json_data[0], failing_json)
+    )
+    rolled_back = []
+
+    def fail_indexing():
+        rolled_back.append(failing_importer.created)
+        raise IlsValidationError(
+            errors=[], original_exception=mocker.Mock(message="invalid")
+        )
+
+    mocker.patch.object(
+        failing_importer, "index_all_records", side_effect=fail_indexing
+    )
+
+    report = _import_entry(
+        dict(import_id=log.id, entry_index=0), importer, "create",
+        entry_writer,
+    )
+    assert _import_entry(
+        dict(import_id=log.id, entry_index=1), failing_importer, "create",
+        entry_writer,
+    ) is None
+    entry_writer.flush()
+    db.session.commit()
+    bulk_indexer.commit()
+
+    created = report["created"]
+    assert document_cls.get_record_by_pid(created["pid"])
+    with pytest.raises(PIDDoesNotExistError):
+        document_cls.get_record_by_pid(rolled_back[0]["pid"])
+    assert log.created_entries == log.failed_entries == 1
+
+    # only the committed document matches its identifiers and is indexed
+    assert identifiers_index.search(json_data[0]["identifiers"]) == [
+        created["pid"]
+    ]
+    assert identifiers_index.search(failing_json["identifiers"]) == []
+    assert str(created.id) in bulk_indexer.record_ids
+    assert str(rolled_back[0].id) not in bulk_indexer.record_ids
+
+
+def test_convert_records_in_processes(app):
+    """Test converting the records in a pool of processes."""
+    source_path = os.path.join(
+        os.path.dirname(__file__), "data", "ebl_record.xml"
+    )
+
+    def convert(workers):
+        with open(source_path, "rb") as source:
+            return list(_convert_records(
+                get_records_list(source), "marcxml", workers=workers
+            ))
+
+    inline = convert(0)
+    in_processes = convert(2)
+
+    assert len(in_processes) == len(inline) == 1
+    (inline_dump, inline_error), = inline
+    (record_dump, error), = in_processes
+    assert error is None and inline_error is None
+    # the conversion timestamps differ
+    assert record_dump[1:] == inline_dump[1:]
+
+
+def test_series_matches_cache(app):
+    """Test matching the series of the previous records of a task."""
+    cache = SeriesMatchesCache()
+    json_series = {"identifiers": [{"scheme": "ISSN", "value": "123455"}]}
+    assert cache.get("ISSN", "123455") is None
+
+    # no series found on the first lookup
+    cache.set("ISSN", "123455", [])
+    # then created by a record
+    cache.add({"pid": "serid-1", **json_series})
+
+    importer = SeriesImporter([json_series], "springer", matches_cache=cache)
+    assert importer.search_for_matching_series(json_series) == ["serid-1"]
+
+    # its creation was rolled back
+    cache.remove("serid-1")
+    assert importer.search_for_matching_series(json_series) == []
+
+    # a series also matches the identifiers not looked up yet
+    cache.add({
+        "pid": "serid-2",
+        "identifiers": [{"scheme": "ISBN", "value": "9780306479151"}],
+    })
+    assert cache.get("ISBN", "9780306479151") == ["serid-2"]
+
+
+def test_get_eitems_records(importer_test_data):
+    """Test loading the records of the eitems matched by a search."""
+    eitem_search_cls = current_app_ils.eitem_search_cls
+
+    search = eitem_search_cls().search_by_document_pid(document_pid="docid-2")
+    eitems = get_eitems_records(search)
+    assert sorted(eitem["pid"] for eitem in eitems) == [
+        "eitemid-1", "eitemid-2"
+    ]
+    # more hits than a single search request returns
+    eitems = get_eitems_records(search, size=1)
+    assert sorted(eitem["pid"] for eitem in eitems) == [
+        "eitemid-1", "eitemid-2"
+    ]
+
+    search = eitem_search_cls().search_by_document_pid(document_pid="none")
+    assert get_eitems_records(search) == []
@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from cds_ils.importer.errors import ImporterTaskNotResumable
+from cds_ils.importer.models import ImportedRecordFingerprint, \
+    ImporterAgent, ImporterMode, ImporterTaskEntry, ImporterTaskEntryWriter, \
+    ImporterTaskLog, ImporterTaskStatus
+
+
+def test_entry_writer(app, db):
+    """Test buffering the task entries and inserting them in bulk."""
+    log = ImporterTaskLog.create(dict(
+        agent=ImporterAgent.CLI,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+    ))
+    writer = ImporterTaskEntryWriter(flush_size=2, flush_interval=60)
+
+    writer.add_failure(
+        dict(import_id=log.id, entry_index=0), Exception("failed")
+    )
+    assert not writer.is_due()
+    writer.add_failure(
+        dict(import_id=log.id, entry_index=1), Exception("failed")
+    )
+    assert writer.is_due()
+    assert log.entries.count() == 0
+
+    writer.flush()
+    db.session.commit()
+
+    assert not writer.is_due()
+    assert [entry.error for entry in log.entries] == [
+        "Exception: failed",
+        "Exception: failed",
+    ]
+    # the counters of the task are updated with the entries
+    assert log.loaded_entries == log.failed_entries == 2
+    assert log.created_entries == 0
+
+    writer.add_unchanged(dict(import_id=log.id, entry_index=2))
+    writer.flush()
+    db.session.commit()
+
+    assert log.loaded_entries == 3
+    assert log.unchanged_entries == 1
+
+
+def test_entries_position(app, db):
+    """Test numbering the entries in the order they are committed."""
+    log = ImporterTaskLog.create(dict(
+        agent=ImporterAgent.CLI,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+    ))
+    writer = ImporterTaskEntryWriter(flush_size=10, flush_interval=60)
+    # e.g. a second chunk committed before the first one
+    for entry_indexes in ((3, 4), (0, 1, 2)):
+        for entry_index in entry_indexes:
+            writer.add_unchanged(
+                dict(import_id=log.id, entry_index=entry_index)
+            )
+        writer.flush()
+        db.session.commit()
+
+    entries = log.entries.order_by(ImporterTaskEntry.position.asc())
+    assert [entry.entry_index for entry in entries] == [3, 4, 0, 1, 2]
+    assert [entry.position for entry in entries] == [0, 1, 2, 3, 4]
+
+
+def test_record_fingerprint(app, db):
+    """Test storing the fingerprints of the imported records."""
+    fingerprint = ImportedRecordFingerprint.compute(
+        dict(title="Title", provider_recid="1", authors=["A", "B"])
+    )
+    # the order of the fields does not matter, their content does
+    assert fingerprint == ImportedRecordFingerprint.compute(
+        dict(authors=["A", "B"], provider_recid="1", title="Title")
+    )
+    assert fingerprint != ImportedRecordFingerprint.compute(
+        dict(title="Title", provider_recid="1", authors=["B", "A"])
+    )
+
+    ImportedRecordFingerprint.store("springer", "1", fingerprint)
+    db.session.commit()
+    assert ImportedRecordFingerprint.get_fingerprints(
+        "springer", ["1", "2"]
+    ) == {"1": fingerprint}
+    assert ImportedRecordFingerprint.get_fingerprints("ebl", ["1"]) == {}
+
+    # storing it again replaces the previous fingerprint
+    ImportedRecordFingerprint.store("springer", "1", "changed")
+    db.session.commit()
+    assert ImportedRecordFingerprint.get_fingerprints(
+        "springer", ["1"]
+    ) == {"1": "changed"}
+
+    ImportedRecordFingerprint.forget("springer", "1")
+    db.session.commit()
+    assert ImportedRecordFingerprint.get_fingerprints("springer", ["1"]) == {}
+
+
+def test_unprocessed_ranges(app, db):
+    """Test finding the records of an interrupted task to import."""
+    log = ImporterTaskLog.create(dict(
+        agent=ImporterAgent.CLI,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+    ))
+    log.entries_count = 8
+    writer = ImporterTaskEntryWriter(flush_size=10, flush_interval=60)
+    for entry_index in (0, 1, 3, 5):
+        writer.add_failure(
+            dict(import_id=log.id, entry_index=entry_index),
+            Exception("failed"),
+        )
+    writer.flush()
+    db.session.commit()
+
+    assert log.unprocessed_ranges() == [(2, 3), (4, 5), (6, 8)]
+    # the source file was not stored
+    assert not log.is_resumable()
+
+
+def test_resumable_task(app, db, tmp_path):
+    """Test resuming only the failed and stale tasks."""
+    source_path = tmp_path / "springer.xml"
+    source_path.write_text("<collection/>")
+    log = ImporterTaskLog.create(dict(
+        agent=ImporterAgent.CLI,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+        source_path=str(source_path),
+    ))
+
+    # the task is still running
+    assert not log.is_resumable()
+    assert log.is_resumable(force=True)
+    with pytest.raises(ImporterTaskNotResumable):
+        log.set_resumed()
+
+    # the task has not progressed for too long
+    timeout = app.config["CDS_ILS_IMPORTER_RESUME_TIMEOUT"]
+    log.heartbeat_time = datetime.now() - timedelta(seconds=timeout + 1)
+    db.session.commit()
+    assert log.is_stale()
+    assert log.is_resumable()
+
+    log.set_failed(Exception("failed"))
+    assert log.is_resumable()
+    log.set_resumed()
+    assert log.status == ImporterTaskStatus.RUNNING
+    assert not log.is_stale()
+
+    log.set_succeeded()
+    assert not log.is_resumable(force=True)
+
+
+def test_finish_chunks(app, db):
+    """Test ending the task with its last chunk."""
+    log = ImporterTaskLog.create(dict(
+        agent=ImporterAgent.CLI,
+        provider="springer",
+        source_type="marcxml",
+        mode=ImporterMode.CREATE,
+        original_filename="springer.xml",
+        chunks_count=2,
+    ))
+
+    ImporterTaskLog.finish_chunk(log.id)
+    assert log.is_running()
+    assert log.finished_chunks == 1
+
+    ImporterTaskLog.finish_chunk(log.id)
+    assert log.status == ImporterTaskStatus.SUCCEEDED
+    assert log.end_time
+
+    # a chunk ending an already ended task leaves it unchanged
+    end_time = log.end_time
+    log.chunks_count = 3
+    db.session.commit()
+    ImporterTaskLog.finish_chunk(log.id, exception=Exception("failed"))
+    assert log.status == ImporterTaskStatus.SUCCEEDED
+    assert log.end_time == end_time
+    assert log.failed_chunks == 1
@@ -0,0 +1,102 @@
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from cds_ils.importer.errors import SourceFileTooLarge
+from cds_ils.importer.parse_xml import count_source_records, \
+    get_records_list, get_source_records, remove_chunk_files, \
+    split_source_records
+
+collection = (
+    """<collection xmlns="http://www.loc.gov/MARC21/slim">"""
+    """<record><controlfield tag="001">1</controlfield></record>"""
+    """<record><controlfield tag="001">2</controlfield></record>"""
+    """<record><controlfield tag="001">3</controlfield></record>"""
+    """</collection>"""
+)
+
+
+def test_get_records_list_streams_records(app):
+    """Test streaming the records of a file."""
+    source = io.BytesIO(collection.encode("utf-8"))
+
+    recids = []
+    for record in get_records_list(source):
+        recids.append(record[0].text)
+        # the records consumed before are freed
+        assert record.getprevious() is None
+
+    assert recids == ["1", "2", "3"]
+
+
+def test_get_source_records_compressed(app, tmp_path):
+    """Test streaming the records of compressed sources."""
+    gzip_path = str(tmp_path / "records.xml.gz")
+    with gzip.open(gzip_path, "wb") as gzip_file:
+        gzip_file.write(collection.encode("utf-8"))
+
+    assert count_source_records(gzip_path) == 3
+    records = get_source_records(gzip_path)
+    assert [record[0].text for record in records] == ["1", "2", "3"]
+
+    # the records of the files of an archive follow each other
+    zip_path = str(tmp_path / "records.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("first.xml", collection)
+        archive.writestr("readme.txt", "not imported")
+        archive.writestr("second.xml", collection)
+
+    assert count_source_records(zip_path) == 6
+    records = get_source_records(zip_path)
+    assert [record[0].text for record in records] == [
+        "1", "2", "3", "1", "2", "3"
+    ]
+
+
+def test_get_source_records_too_large(app, tmp_path):
+    """Test refusing the files too large once decompressed."""
+    max_size = app.config["CDS_ILS_IMPORTER_MAX_DECOMPRESSED_SIZE"]
+    app.config["CDS_ILS_IMPORTER_MAX_DECOMPRESSED_SIZE"] = 100
+    try:
+        gzip_path = str(tmp_path / "records.xml.gz")
+        with gzip.open(gzip_path, "wb") as gzip_file:
+            gzip_file.write(collection.encode("utf-8"))
+        with pytest.raises(SourceFileTooLarge):
+            count_source_records(gzip_path)
+
+        zip_path = str(tmp_path / "records.zip")
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            archive.writestr("first.xml", collection)
+        with pytest.raises(SourceFileTooLarge):
+            count_source_records(zip_path)
+    finally:
+        app.config["CDS_ILS_IMPORTER_MAX_DECOMPRESSED_SIZE"] = max_size
+
+
+def test_split_source_records(app, tmp_path):
+    """Test splitting the records of a source in chunk files."""
+    zip_path = str(tmp_path / "records.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("first.xml", collection)
+        archive.writestr("second.xml", collection)
+    chunks_path = tmp_path / "chunks"
+    chunks_path.mkdir()
+
+    chunks = split_source_records(
+        zip_path, [(0, 2), (3, 5), (5, 10)], str(chunks_path)
+    )
+
+    assert [(start, end) for start, end, _ in chunks] == [
+        (0, 2), (3, 5), (5, 10)
+    ]
+    # the chunks are stored compressed
+    assert all(chunk_path.endswith(".xml.gz") for _, _, chunk_path in chunks)
+    assert [
+        [record[0].text for record in get_source_records(chunk_path)]
+        for _, _, chunk_path in chunks
+    ] == [["1", "2"], ["1", "2"], ["3"]]
+
+    remove_chunk_files(chunks)
+    assert list(chunks_path.iterdir()) == []
@@ -1,9 +1,14 @@
+import pytest
 from cds_dojson.matcher import matcher
 
+from cds_ils.importer import warm_up_models
+from cds_ils.importer.errors import UnknownProvider
+from cds_ils.importer.providers import get_importer_class
 from cds_ils.importer.providers.cds.models import book as cds_book
 from cds_ils.importer.providers.ebl import ebl
 from cds_ils.importer.providers.safari import safari
 from cds_ils.importer.providers.springer import springer
+from cds_ils.importer.providers.springer.importer import SpringerImporter
 
 
 def test_matcher():
@@ -21,3 +26,16 @@ def test_matcher():
         safari_document_blob1, "cds_ils.importer.models"
     )
     assert ebl.model == matcher(ebl_document_blob1, "cds_ils.importer.models")
+
+
+def test_warm_up_models():
+    warm_up_models()
+    for module in (cds_book, ebl, safari, springer):
+        assert module.model.index is not None
+
+
+def test_get_importer_class():
+    assert get_importer_class("springer") is SpringerImporter
+    assert get_importer_class("springer") is get_importer_class("springer")
+    with pytest.raises(UnknownProvider):
+        get_importer_class("unknown")
@@ -1,7 +1,9 @@
 import os
 
 from cds_dojson.marc21.utils import create_record
+from cds_dojson.utils import not_accessed_keys
 
+from cds_ils.importer.overdo import RuleProfiler
 from cds_ils.importer.providers.springer.springer import model
 
 marcxml = (
@@ -97,3 +99,38 @@ def test_springer_transformation(app):
                 "title": "Advances in Nuclear Physics",
             },
         )
+
+
+def test_springer_missing_keys(app):
+    """Test recording the missing keys while translating."""
+    dirname = os.path.join(os.path.dirname(__file__), "data")
+    with open(os.path.join(dirname, "springer_record.xml"), "r") as fp:
+        example = fp.read()
+
+    blob = create_record(marcxml.format(example))
+    model.do(blob, ignore_missing=True)
+    missing = model.missing(blob)
+
+    # the same keys as walking the translated record again
+    assert missing == not_accessed_keys(blob) - model.__ignore_keys__
+
+
+def test_springer_rules_profiling(app):
+    """Test profiling the rules while translating."""
+    dirname = os.path.join(os.path.dirname(__file__), "data")
+    with open(os.path.join(dirname, "springer_record.xml"), "r") as fp:
+        example = fp.read()
+
+    blob = create_record(marcxml.format(example))
+    with RuleProfiler() as profiler:
+        model.do(blob, ignore_missing=True)
+
+    assert RuleProfiler.current() is None
+    report = profiler.report()
+    assert report
+    for stat in report:
+        assert stat["model"] == "SpringerDocument"
+        assert stat["calls"] >= 1
+    assert [stat["time"] for stat in report] == sorted(
+        [stat["time"] for stat in report], reverse=True
+    )
@@ -0,0 +1,51 @@
+import io
+import json
+import logging
+import os
+
+from cds_ils.migrator.api import BulkIndexedRecords, \
+    _import_documents_in_workers, migrated_logger
+
+
+def test_bulk_indexed_records(app, mocker):
+    """Test indexing the migrated records by batches."""
+    bulk_index = mocker.patch("cds_ils.migrator.api.bulk_index_records")
+
+    with BulkIndexedRecords(size=2) as records:
+        for record in range(5):
+            records.append(record)
+        assert bulk_index.call_count == 2
+
+    # the remaining records are indexed when leaving the context
+    assert [call[0][0] for call in bulk_index.call_args_list] == [
+        [0, 1], [2, 3], [4]
+    ]
+
+
+def test_import_documents_in_workers(app, mocker, caplog):
+    """Test importing the documents of a dump in worker processes."""
+
+    def import_document_item(item, source_type, eager, include):
+        migrated_logger.warning("#RECID {0}: OK".format(item["recid"]))
+
+    mocker.patch(
+        "cds_ils.migrator.api._import_document_item", import_document_item
+    )
+    # e.g. a dump read from the standard input, without a file name
+    dump_file = io.StringIO(
+        json.dumps([{"recid": recid} for recid in range(10)])
+    )
+
+    with caplog.at_level(logging.WARNING, logger="migrated_records"):
+        count = _import_documents_in_workers(dump_file, "marcxml", None, 3)
+
+    assert count == 10
+    # the logs of the workers are merged in the parent process
+    logs = [
+        record for record in caplog.records
+        if record.name == "migrated_records"
+    ]
+    assert sorted(record.getMessage() for record in logs) == sorted(
+        "#RECID {0}: OK".format(recid) for recid in range(10)
+    )
+    assert all(record.process != os.getpid() for record in logs)
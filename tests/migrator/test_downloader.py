@@ -0,0 +1,76 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+from cds_ils.migrator.eitems.downloader import LegacyFilesDownloader, \
+    TokenBucket
+
+FILE_CONTENT = b"%PDF legacy file content" * 10000
+
+
+class LegacyFilesHandler(BaseHTTPRequestHandler):
+    """Serve a legacy file."""
+
+    def do_GET(self):
+        """Send the file, or not found."""
+        if self.path != "/record/1/files/file.pdf":
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(FILE_CONTENT)))
+        self.end_headers()
+        self.wfile.write(FILE_CONTENT)
+
+    def log_message(self, *args):
+        """Do not log the requests."""
+
+
+@pytest.fixture()
+def legacy_server():
+    """Local stand-in of the legacy server."""
+    server = HTTPServer(("127.0.0.1", 0), LegacyFilesHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_legacy_file(app, legacy_server):
+    """Test streaming a legacy file."""
+    downloader = LegacyFilesDownloader(concurrency=2, rate=100, timeout=5)
+    url = legacy_server + "/record/1/files/file.pdf"
+
+    with downloader.open(url) as stream:
+        content = b"".join(iter(lambda: stream.read(4096), b""))
+    assert content == FILE_CONTENT
+
+    with pytest.raises(requests.HTTPError):
+        with downloader.open(legacy_server + "/record/2/files/file.pdf"):
+            pass
+
+
+def test_run_concurrently(app):
+    """Test processing the documents in the pool of threads."""
+    downloader = LegacyFilesDownloader(concurrency=3, rate=100, timeout=5)
+
+    def process(value, downloader):
+        time.sleep(0.01 * (value % 3))
+        return value * 2
+
+    assert list(downloader.run(process, range(10))) == [
+        value * 2 for value in range(10)
+    ]
+
+
+def test_token_bucket():
+    """Test limiting the rate of the downloads."""
+    rate_limit = TokenBucket(rate=50, capacity=2)
+    start = time.monotonic()
+    for _ in range(7):
+        rate_limit.acquire()
+    # two tokens are available at once, the others are added at the rate
+    assert time.monotonic() - start >= 5 / 50.0 * 0.9
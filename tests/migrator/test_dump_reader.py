@@ -0,0 +1,42 @@
+import io
+import json
+
+import pytest
+
+from cds_ils.migrator.dump_reader import JSONDumpReader
+
+records = [
+    {"legacy_id": 1, "title": "Title, with [brackets] and {braces}"},
+    {"legacy_id": 2, "price": 12345.678e-2, "tags": ["a", "b"]},
+    [],
+    123456789,
+    None,
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 4096])
+def test_iter_array(chunk_size):
+    """Test streaming the values of an array dump."""
+    dump_file = io.StringIO(json.dumps(records, indent=2))
+    reader = JSONDumpReader(dump_file, chunk_size=chunk_size)
+
+    assert list(reader.iter_array()) == records
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 4096])
+def test_iter_items(chunk_size):
+    """Test streaming the items of an object dump."""
+    dump = {str(index): record for index, record in enumerate(records)}
+    dump_file = io.StringIO(json.dumps(dump))
+    reader = JSONDumpReader(dump_file, chunk_size=chunk_size)
+
+    assert list(reader.iter_items()) == list(dump.items())
+
+
+def test_iter_invalid_dump():
+    """Test reading an invalid dump."""
+    with pytest.raises(json.JSONDecodeError):
+        list(JSONDumpReader(io.StringIO("[1, 2")).iter_array())
+
+    with pytest.raises(json.JSONDecodeError):
+        list(JSONDumpReader(io.StringIO("[1, 2]")).iter_items())
@@ -0,0 +1,113 @@
+import hashlib
+import io
+import os
+
+import pytest
+from invenio_files_rest.models import Bucket
+from invenio_pidstore.errors import PIDDoesNotExistError
+
+from cds_ils.migrator.eitems.api import create_file, migrate_document_files
+from cds_ils.migrator.errors import FileMigrationError
+
+FILE_CONTENT = b"%PDF legacy file content"
+
+FILE_CHECKSUM = hashlib.md5(FILE_CONTENT).hexdigest()
+
+
+def stored_files(location):
+    """Return the paths of the files stored in a location."""
+    return [
+        os.path.join(path, name)
+        for path, _, names in os.walk(location.uri)
+        for name in names
+    ]
+
+
+def test_create_file(app, db, location):
+    """Test storing a legacy file in a bucket."""
+    bucket = Bucket.create()
+
+    file_record = create_file(
+        bucket, io.BytesIO(FILE_CONTENT), "file.pdf", FILE_CHECKSUM
+    )
+    db.session.commit()
+
+    assert file_record.bucket_id == bucket.id
+    assert file_record.key == "file.pdf"
+    assert file_record.file.checksum == "md5:{}".format(FILE_CHECKSUM)
+    with file_record.file.storage().open() as stored_file:
+        assert stored_file.read() == FILE_CONTENT
+
+
+def test_create_file_checksum_mismatch(app, db, location):
+    """Test deleting the stored file when its checksum does not match."""
+    bucket = Bucket.create()
+
+    with pytest.raises(FileMigrationError):
+        create_file(
+            bucket,
+            io.BytesIO(FILE_CONTENT),
+            "file.pdf",
+            hashlib.md5(b"other content").hexdigest(),
+        )
+    db.session.rollback()
+
+    assert stored_files(location) == []
+
+
+class LegacyDocument(dict):
+    """Document with legacy files, not stored in the database."""
+
+    pid = "1"
+
+    def commit(self):
+        """Do not store the document."""
+
+
+def test_migrate_document_files_skips_stored_files(app, db, mocker):
+    """Test migrating only the legacy files not stored yet."""
+    stored_url = "http://cds.cern.ch/record/1/files/stored.pdf"
+    new_url = "http://cds.cern.ch/record/1/files/new.pdf"
+    document = LegacyDocument(
+        pid="1",
+        _migration=dict(
+            files=[
+                dict(url=stored_url, checksum=FILE_CHECKSUM),
+                dict(url=new_url, checksum="0" * 32),
+            ],
+            eitems_file_links=[dict(value=stored_url), dict(value=new_url)],
+            eitems_has_files=True,
+            has_files=True,
+        ),
+    )
+    current_app_ils = mocker.patch(
+        "cds_ils.migrator.eitems.api.current_app_ils"
+    )
+    current_app_ils.document_record_cls.get_record_by_pid.return_value = \
+        document
+    mocker.patch(
+        "cds_ils.migrator.eitems.api.get_stored_files_checksums",
+        return_value={"md5:{}".format(FILE_CHECKSUM)},
+    )
+    migrate_file = mocker.patch("cds_ils.migrator.eitems.api.migrate_file")
+    mocker.patch("cds_ils.migrator.eitems.api.DocumentIndexer")
+
+    assert migrate_document_files("1", downloader=None)
+
+    migrate_file.assert_called_once_with(
+        document, document["_migration"]["files"][1], None
+    )
+    assert document["_migration"]["has_files"] is False
+
+
+def test_migrate_document_files_missing_document(app, db, mocker):
+    """Test logging the failure to find the document of the files."""
+    current_app_ils = mocker.patch(
+        "cds_ils.migrator.eitems.api.current_app_ils"
+    )
+    current_app_ils.document_record_cls.get_record_by_pid.side_effect = \
+        PIDDoesNotExistError("docid", "1")
+    migrate_file = mocker.patch("cds_ils.migrator.eitems.api.migrate_file")
+
+    assert not migrate_document_files("1", downloader=None)
+    assert not migrate_file.called
@@ -0,0 +1,85 @@
+import logging
+
+from cds_ils.migrator.indexer import BulkReindexer, IndicesRefresh, _chunks
+
+
+def test_chunks():
+    """Test splitting the uuids of the records in chunks."""
+    assert list(_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(_chunks(range(4), 2)) == [[0, 1], [2, 3]]
+    assert list(_chunks([], 2)) == []
+
+
+def test_indices_refresh(mocker):
+    """Test disabling the refresh of the indices, then restoring it."""
+    client = mocker.Mock()
+    client.indices.get_settings.return_value = {
+        "documents-document-v1.0.0": {
+            "settings": {"index": {"refresh_interval": "5s"}}
+        },
+    }
+    refresh = IndicesRefresh(client)
+
+    refresh.disable("documents")
+    refresh.disable("documents")
+
+    # the settings of an index are fetched once
+    client.indices.get_settings.assert_called_once_with(
+        index="documents", name="index.refresh_interval"
+    )
+    client.indices.put_settings.assert_called_once_with(
+        index="documents-document-v1.0.0",
+        body={"index": {"refresh_interval": "-1"}},
+    )
+
+    client.indices.put_settings.reset_mock()
+    refresh.restore()
+
+    client.indices.put_settings.assert_called_once_with(
+        index="documents-document-v1.0.0",
+        body={"index": {"refresh_interval": "5s"}},
+    )
+    client.indices.refresh.assert_called_once_with(
+        index="documents-document-v1.0.0"
+    )
+    assert refresh.intervals == {}
+
+
+def test_indices_refresh_default_interval(mocker):
+    """Test restoring the default refresh interval of an index."""
+    client = mocker.Mock()
+    client.indices.get_settings.return_value = {
+        "documents-document-v1.0.0": {},
+    }
+    refresh = IndicesRefresh(client)
+
+    refresh.disable("documents")
+    refresh.restore()
+
+    client.indices.put_settings.assert_called_with(
+        index="documents-document-v1.0.0",
+        body={"index": {"refresh_interval": None}},
+    )
+
+
+def test_bulk_reindexer_logs_errors(app, mocker, caplog):
+    """Test logging the records which failed to be indexed."""
+    mocker.patch(
+        "cds_ils.migrator.indexer.parallel_bulk",
+        return_value=[
+            (True, {"index": {"_id": "1", "status": 200}}),
+            (False, {"index": {"_id": "2", "error": "mapper_parsing"}}),
+        ],
+    )
+    reindexer = BulkReindexer(workers=0)
+    bar = mocker.Mock()
+
+    with caplog.at_level(logging.ERROR, logger="records_errored"):
+        reindexer._bulk("docid", None, bar)
+
+    assert reindexer.errors == 1
+    assert bar.update.call_count == 2
+    assert [
+        record.getMessage() for record in caplog.records
+        if record.name == "records_errored"
+    ] == ["@UUID: 2 INDEXING ERROR: mapper_parsing"]
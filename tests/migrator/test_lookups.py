@@ -0,0 +1,15 @@
+from cds_ils.migrator.lookups import LookupMap
+
+
+def test_lookup_map():
+    """Test mapping legacy identifiers to the pids of the records."""
+    lookup = LookupMap([(1, "1"), ("2", "2"), ("2", "3"), (1, "1")])
+
+    assert len(lookup) == 2
+    # legacy identifiers are numbers in the dumps, strings in the records
+    assert lookup.get("1") == lookup.get(1) == ["1"]
+    assert lookup.get(2) == ["2", "3"]
+    assert lookup.get(3) == []
+
+    lookup.add(3, "4")
+    assert lookup.get("3") == ["4"]
@@ -56,7 +56,7 @@ export class ImportedDocuments extends React.Component {
     const { taskId } = this.props;
 
     if (!importCompleted) {
-      const nextEntry = _get(data, 'loaded_entries', 0);
+      const nextEntry = _get(data, 'next_entry', 0);
       const knownEntries = _get(data, 'reports', []);
       const response = await importerApi.check(taskId, nextEntry);
       const responseData = response.data;
@@ -65,7 +65,7 @@ export class ImportedDocuments extends React.Component {
           _get(responseData, 'reports', [])
         );
       }
-      if (response.data.state !== 'RUNNING') {
+      if (response.data.state !== 'RUNNING' && !response.data.has_more) {
         this.setState({
           importCompleted: true,
           isLoading: false,